@@ -6,6 +6,10 @@ Created on Fri Sep 20 15:53:35 2019
 @author: Ary
 """
 
+import sys
+sys.path.append('../VariousCodes')
+from regression import design_matrix, bias_variance_accumulator
+
 import numpy as np
 import pandas as pd
 import sklearn.linear_model as skl
@@ -34,16 +38,7 @@ def FrankeFunction(x,y):
     return term1 + term2 + term3 + term4
 
 def Design_Matrix_X(x, y, n):
-	N = len(x)
-	l = int((n+1)*(n+2)/2)		
-	X = np.ones((N,l))
-
-	for i in range(1,n+1):
-		q = int((i)*(i+1)/2)
-		for k in range(i+1):
-			X[:,q+k] = x**(i-k) * y**k
-
-	return X
+	return design_matrix(x, y, n)
 
 n_x=1000
 m=5
@@ -131,12 +126,15 @@ def k_fold(k,x,y,z,m,model):
     z_test1 = np.zeros((200,k))
     z_train1 = np.zeros((800,k))
     z_pred_train = np.zeros((800,k))
+    X_all = Design_Matrix_X(x,y,m) # built once, the folds are row subsets
     for i in range(k):
-        x_l,y_l,z_l,x_test,y_test,z_test=train_test_splitdata(x,y,z,j[i*n_k:(i+1)*n_k])
+        test = j[i*n_k:(i+1)*n_k]
+        train = np.delete(np.arange(n),test)
+        z_l, z_test = z[train], z[test]
         z_test1[:,i]=z_test
         z_train1[:,i]=z_l
-        X = Design_Matrix_X(x_l,y_l,m)
-        X_test= Design_Matrix_X(x_test,y_test,m)
+        X = X_all[train]
+        X_test= X_all[test]
         #print(pd.DataFrame(X))
         #print(pd.DataFrame(X_test))
         beta1= model.fit(X,z_l)
@@ -270,28 +268,26 @@ variance___ = np.zeros(maxdegree)
 polydegree = np.zeros(maxdegree)
 error_train = np.zeros(maxdegree)
 x_train, x_test, y_train, y_test, z_train, z_test = train_test_split(x, y, z, test_size=0.2, shuffle=True)
-z_test1 = np.zeros((200,100))
-z_train1 = np.zeros((800,100))
-for i in range(100):
-    z_test1[:,i]=z_test
 
 for degree in range(maxdegree):
     model = LinearRegression(fit_intercept=False)
-    z_pred = np.empty((z_test.shape[0],n_boostraps))
-    z_pred_train = np.empty((z_train.shape[0],n_boostraps))
+    # the test predictions are accumulated on the fly instead of stored per bootstrap
+    boot = bias_variance_accumulator(z_test)
+    mse_train = 0
+    X_test= Design_Matrix_X(x_test,y_test,degree)
     for i in range(n_boostraps):
         x_, y_, z_ = resample(x_train, y_train, z_train)
-        z_train1[:,i] = z_
         X_train = Design_Matrix_X(x_,y_,degree)
-        X_test= Design_Matrix_X(x_test,y_test,degree)  
-        z_pred[:, i] = model.fit(X_train, z_).predict(X_test).ravel()
-        z_pred_train[:, i] = model.fit(X_train, z_).predict(X_train).ravel()
+        model.fit(X_train, z_)
+        boot.add(model.predict(X_test).ravel())
+        mse_train += np.mean((z_ - model.predict(X_train).ravel())**2)
     
     polydegree[degree] = degree
-    error_test[degree] = np.mean(np.mean((z_test1 - z_pred)**2 , axis=1, keepdims=True))
-    bias___[degree] = np.mean( (z_test1 - np.mean(z_pred, axis=1, keepdims=True))**2 )
-    variance___[degree] = np.mean( np.var(z_pred, axis=1, keepdims=True))
-    error_train[degree] = np.mean(np.mean((z_train1 - z_pred_train)**2 , axis=1, keepdims=True))
+    result = boot.result()
+    error_test[degree] = result['MSE']
+    bias___[degree] = result['bias']
+    variance___[degree] = result['variance']
+    error_train[degree] = mse_train/n_boostraps
     #print(degree)
     #print(error_test)
     #print(bias___)
@@ -383,28 +379,25 @@ variance___ = np.zeros(len(lamdas))
 polylamda = np.zeros(len(lamdas))
 error_train = np.zeros(len(lamdas))
 x_train, x_test, y_train, y_test, z_train, z_test = train_test_split(x, y, z, test_size=0.2, shuffle=True)
-z_test1 = np.zeros((200,100))
-z_train1 = np.zeros((800,100))
-for i in range(100):
-    z_test1[:,i]=z_test
 
 for lamda in lamdas:
     model = skl.Ridge(alpha=lamda)
-    z_pred = np.empty((z_test.shape[0],n_boostraps))
-    z_pred_train = np.empty((z_train.shape[0],n_boostraps))
+    boot = bias_variance_accumulator(z_test)
+    mse_train = 0
+    X_test= Design_Matrix_X(x_test,y_test,5)
     for i in range(n_boostraps):
         x_, y_, z_ = resample(x_train, y_train, z_train)
-        z_train1[:,i] = z_
         X_train = Design_Matrix_X(x_,y_,5)
-        X_test= Design_Matrix_X(x_test,y_test,5)  
-        z_pred[:, i] = model.fit(X_train, z_).predict(X_test).ravel()
-        z_pred_train[:, i] = model.fit(X_train, z_).predict(X_train).ravel()
+        model.fit(X_train, z_)
+        boot.add(model.predict(X_test).ravel())
+        mse_train += np.mean((z_ - model.predict(X_train).ravel())**2)
     
     polylamda[lamdas.index(lamda)] = lamda
-    error_test[lamdas.index(lamda)] = np.mean(np.mean((z_test1 - z_pred)**2 , axis=1, keepdims=True))
-    bias___[lamdas.index(lamda)] = np.mean( (z_test1 - np.mean(z_pred, axis=1, keepdims=True))**2 )
-    variance___[lamdas.index(lamda)] = np.mean( np.var(z_pred, axis=1, keepdims=True))
-    error_train[lamdas.index(lamda)] = np.mean(np.mean((z_train1 - z_pred_train)**2 , axis=1, keepdims=True))
+    result = boot.result()
+    error_test[lamdas.index(lamda)] = result['MSE']
+    bias___[lamdas.index(lamda)] = result['bias']
+    variance___[lamdas.index(lamda)] = result['variance']
+    error_train[lamdas.index(lamda)] = mse_train/n_boostraps
     print(lamda)
     print(error_test)
     print(bias___)
@@ -475,28 +468,25 @@ variance___ = np.zeros(len(lamdas))
 polylamda = np.zeros(len(lamdas))
 error_train = np.zeros(len(lamdas))
 x_train, x_test, y_train, y_test, z_train, z_test = train_test_split(x, y, z, test_size=0.2, shuffle=True)
-z_test1 = np.zeros((200,100))
-z_train1 = np.zeros((800,100))
-for i in range(100):
-    z_test1[:,i]=z_test
 
 for lamda in lamdas:
     model = skl.Lasso(alpha=lamda)
-    z_pred = np.empty((z_test.shape[0],n_boostraps))
-    z_pred_train = np.empty((z_train.shape[0],n_boostraps))
+    boot = bias_variance_accumulator(z_test)
+    mse_train = 0
+    X_test= Design_Matrix_X(x_test,y_test,5)
     for i in range(n_boostraps):
         x_, y_, z_ = resample(x_train, y_train, z_train)
-        z_train1[:,i] = z_
         X_train = Design_Matrix_X(x_,y_,5)
-        X_test= Design_Matrix_X(x_test,y_test,5)  
-        z_pred[:, i] = model.fit(X_train, z_).predict(X_test).ravel()
-        z_pred_train[:, i] = model.fit(X_train, z_).predict(X_train).ravel()
+        model.fit(X_train, z_)
+        boot.add(model.predict(X_test).ravel())
+        mse_train += np.mean((z_ - model.predict(X_train).ravel())**2)
     
     polylamda[lamdas.index(lamda)] = lamda
-    error_test[lamdas.index(lamda)] = np.mean(np.mean((z_test1 - z_pred)**2 , axis=1, keepdims=True))
-    bias___[lamdas.index(lamda)] = np.mean( (z_test1 - np.mean(z_pred, axis=1, keepdims=True))**2 )
-    variance___[lamdas.index(lamda)] = np.mean( np.var(z_pred, axis=1, keepdims=True))
-    error_train[lamdas.index(lamda)] = np.mean(np.mean((z_train1 - z_pred_train)**2 , axis=1, keepdims=True))
+    result = boot.result()
+    error_test[lamdas.index(lamda)] = result['MSE']
+    bias___[lamdas.index(lamda)] = result['bias']
+    variance___[lamdas.index(lamda)] = result['variance']
+    error_train[lamdas.index(lamda)] = mse_train/n_boostraps
     print(lamda)
     print(error_test)
     print(bias___)
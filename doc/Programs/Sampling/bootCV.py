@@ -1,3 +1,7 @@
+import sys
+sys.path.append('../VariousCodes')
+from regression import power_table, bootstrap
+
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.linear_model import LinearRegression, Ridge, Lasso
@@ -40,15 +44,11 @@ degrees = np.arange(1,16)
 for degree in degrees:
     x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2)
 
-    model = make_pipeline(PolynomialFeatures(degree=degree), LinearRegression(fit_intercept=False))
-    y_pred = np.empty((y_test.shape[0], n_boostraps))
-    for i in range(n_boostraps):
-        x_, y_ = resample(x_train, y_train)
-        # Evaluate the new model on the same test data each time.
-        y_pred[:, i] = model.fit(x_, y_).predict(x_test).ravel()
-    error = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
-    bias = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
-    variance = np.mean( np.var(y_pred, axis=1, keepdims=True) )
+    # All bootstrap fits are solved as stacked batches from their resampling weights,
+    # and evaluated on the same test data each time.
+    X_train = power_table(x_train, degree); X_test = power_table(x_test, degree)
+    boot = bootstrap(X_train, y_train, n_boostraps, X_test, y_test)
+    error, bias, variance = boot['MSE'], boot['bias'], boot['variance']
     err.append(error)
     bi.append(bias)
     vari.append(variance)
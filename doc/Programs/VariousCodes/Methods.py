@@ -5,6 +5,7 @@ import numpy as np
 from scipy import linalg
 import matplotlib.pyplot as plt
 import time
+from regression import polynomial_powers, grid_design_matrix, grid_surface, degree_path, ridge_path, lasso_path, scores, gram_scores, fold_indices, kfold_cv, ridge_loocv, bootstrap, solve, monomial_coefficients, grid_study, grid_mean, GRID_METHODS, cached_result
 
 # Variance
 def var(f_model):
@@ -46,11 +47,8 @@ def SVDinv(A):
     numpy and scipy.linalg at the cost of being slower.
     '''
     U, s, VT = linalg.svd(A)
-    D = np.zeros((len(U),len(VT)))
-    for i in range(0,len(VT)):
-        D[i,i]=s[i]
-    UT = np.transpose(U); V = np.transpose(VT); invD = np.linalg.inv(D)
-    return np.matmul(V,np.matmul(invD,UT))
+    # inv(A) = V inv(D) U^T, where inv(D) just scales the rows of U^T by 1/s
+    return np.matmul(np.transpose(VT),np.transpose(U)/s[:,None])
 
 #================================================================================================================
 
@@ -76,13 +74,8 @@ def R2(x_true,x_predict):
 def get_subset(A,indices):
     '''given an indexing set "indices", return the vector consisting of 
     entries A[i,j] where (i,j) is an entry in indices.'''
-    N = len(indices)
-    B = np.zeros(N)
-    for k in range(0,N):
-        i = indices[k][0]
-        j = indices[k][1]
-        B[k] = A[j,i]
-    return B
+    indices = np.asarray(indices)
+    return A[indices[:,1],indices[:,0]]
 
 
 #============================================================================================================================
@@ -92,127 +85,102 @@ class k_cross_validation:
     and a paritition of the data. The class function R2 calculates the mean R2 scores
     of test and training data for the given model. The function MSE calculates the mean MSE, bias,
     variance and error terms of the test data for the given model. These quantities are stored
-    as self variables.'''
+    as self variables.
+
+    The folds are not refitted from scratch: X^TX and X^Tz are computed once, and the training system of
+    each fold is found by subtracting the contribution of the fold (see "kfold_cv" in regression.py).'''
 
     def __init__(self, data, partition,*args):
         self.data = data; self.partition = partition; self.args = args;
-        #f = data.f; X = data.X; z = data.z; correspondence = data.correspondence; 
         self.k = len(partition)
         self.test_R2, self.test_var, self.test_bias, self.test_MSE, self.test_extra_terms = 0, 0, 0, 0, 0
         self.train_R2 = 0
-        
-        #self.train_var, self.train_bias, self.train_MSE, self.train_extra_terms = 0, 0, 0, 0
-
-    def R2(self):
-        data = self.data
-        f = data.f; X = data.X; z = data.z; correspondence = data.correspondence; partition = self.partition
-        k = self.k
-        args = self.args
-        
-        test_R2, train_R2 = 0, 0
 
-        for i, test_data in enumerate(partition):
-            train_data = [x for j,x in enumerate(partition) if j!=i]
-            train_data = sum(train_data, [])
-            beta = data.get_beta(X[train_data],z[train_data],*args)
-            freg = data.model(beta)
-            test_data = [correspondence[j] for j in test_data]
-            train_data = [correspondence[j] for j in train_data]
+    def cross_validate(self, lambdas = None):
+        '''Runs the cross validation for all folds and returns the dictionary of scores from "kfold_cv",
+        with one column per LAMBDA. If lambdas is None, the LAMBDA given by the arguments is used.'''
+        data = self.data; args = self.args
+        if lambdas is None:
+            lambdas = args[0] if len(args) >= 1 else 0.0
+        if len(args) >= 2: # Lasso
+            return kfold_cv(data.X, data.z, self.partition, lambdas, lasso=True, tol=args[1])
+        return kfold_cv(data.X, data.z, self.partition, lambdas)
 
-            # test errors:
-            ftest = get_subset(f,test_data); fregtest = get_subset(freg,test_data)
-            test_R2 +=  R2(ftest,fregtest)
-
-            #training errors:
-            ftrain = get_subset(f,train_data); fregtrain = get_subset(freg,train_data)
-            train_R2 +=  R2(ftrain,fregtrain)
-
-        # self variables
-        self.test_R2 = test_R2/k
-        self.train_R2 = train_R2/k
+    def R2(self):
+        # z[j] equals f at correspondence[j], so the scores are computed directly on z
+        cv = self.cross_validate()
+        self.test_R2 = np.mean(cv['test_R2'][:,0])
+        self.train_R2 = np.mean(cv['train_R2'][:,0])
+
+    def R2_ridge_path(self, lambdas):
+        '''Same as R2, but for Ridge regression with a whole vector of lambdas, solved as one batch.
+        test_R2 and train_R2 become arrays with one entry per LAMBDA.'''
+        cv = k_cross_validation(self.data, self.partition, 0.0).cross_validate(lambdas)
+        self.test_R2 = np.mean(cv['test_R2'], axis=0)
+        self.train_R2 = np.mean(cv['train_R2'], axis=0)
+
+    def R2_lasso_path(self, lambdas, epsilon = 0.001):
+        '''Same as R2_ridge_path, but for Lasso regression. Each fold runs one warm started
+        coordinate descent path over the lambdas (see "lasso_path" in regression.py).'''
+        cv = k_cross_validation(self.data, self.partition, 0.0, epsilon).cross_validate(lambdas)
+        self.test_R2 = np.mean(cv['test_R2'], axis=0)
+        self.train_R2 = np.mean(cv['train_R2'], axis=0)
 
     def MSE(self):
-        data = self.data
-        f = data.f; X = data.X; z = data.z; correspondence = data.correspondence; partition = self.partition
-        k = self.k
-        args = self.args
-
-        test_var, test_bias, test_MSE, test_extra_terms = 0, 0, 0, 0
-        #train_var, train_bias, train_MSE, train_extra_terms = 0, 0, 0, 0
-
-        for i, test_data in enumerate(partition):
-            train_data = [x for j,x in enumerate(partition) if j!=i]
-            train_data = sum(train_data, [])
-            beta = data.get_beta(X[train_data],z[train_data],*args)
-            freg = data.model(beta)
-            test_data = [correspondence[j] for j in test_data]
-            # train_data = [correspondence[j] for j in train_data]
-
-            # test errors:
-            ftest = get_subset(f,test_data); fregtest = get_subset(freg,test_data)
-            test_var += var(fregtest) 
-            test_bias += bias(ftest,fregtest)
-            test_MSE += MSE(ftest,fregtest)
-            test_extra_terms += extra_term(ftest,fregtest)
-
-            ##training errors:
-            #ftrain = get_subset(f,train_data); fregtrain = get_subset(freg,train_data)
-            #train_var += var(fregtrain) 
-            #train_bias += bias(ftrain,fregtrain)
-            #train_MSE += MSE(ftrain,fregtrain)
-            #train_extra_terms += extra_term(ftrain,fregtrain)
-
-        # self variables
-        self.test_var = test_var/k
-        self.test_bias = test_bias/k
-        self.test_MSE = test_MSE/k
-        self.test_extra_terms = test_extra_terms/k
-
-        #self.train_var = train_var/k
-        #self.train_bias = train_bias/k
-        #self.train_MSE = train_MSE/k
-        #self.train_extra_terms = train_extra_terms/k
+        cv = self.cross_validate()
+        self.test_var = np.mean(cv['test_variance'][:,0])
+        self.test_bias = np.mean(cv['test_bias'][:,0])
+        self.test_MSE = np.mean(cv['test_MSE'][:,0])
+        self.test_extra_terms = np.mean(cv['test_extra_term'][:,0])
 
 #================================================================================================================
 
 class regdata:
-    def __init__(self, f, degree):
+    def __init__(self, f, degree, basis = 'monomial'):
         # initializing variables
         m = len(f[0,:]); n = len(f);  mn = m*n; 
-        x = np.linspace(0, 1, m); y = np.linspace(0, 1, n); z = np.zeros(mn); xy = np.zeros((mn,2)); 
+        x = np.linspace(0, 1, m); y = np.linspace(0, 1, n)
 
         # initializing some self variables
-        self.f = f; self.degree = degree; self.xm, self.ym = np.meshgrid(x,y); self.n=n;self.m=m;  self.mn = mn; self.correspondence = []
+        self.f = f; self.degree = degree; self.basis = basis; self.x = x; self.y = y; self.xm, self.ym = np.meshgrid(x,y); self.n=n;self.m=m;  self.mn = mn
         
-        # Making a sequence xy containing the pairs (x_i,y_j) for i,j=0,...,n, and a sequence z with matching pairs z_ij = f(x_i, y_j)
-        counter = 0
-        for i in range(0,m):
-            for j in range(0,n):
-                z[counter]=f[j,i] #wtf
-                xy[counter,:] = [x[i],y[j]]
-                self.correspondence.append([i,j]) #Saves the 1-1 correspondence: {counter} <-> {(i,j)} for later
-                counter+=1
-        self.z = z
-
-        # Make X
-        number_basis_elts=int((degree+2)*(degree+1)/2) #(degree+1)th triangular number (number of basis elements for R[x,y] of degree <= degree)
-        X = np.zeros((mn,number_basis_elts))
-        powers = []
-        for i in range(0,mn):
-            counter = 0
-            for j in range(0,degree+1):
-                k = 0
-                while j+k <= degree:
-                    xi = xy[i,0]
-                    yi = xy[i,1]
-                    X[i,counter]= (xi**j)*(yi**k)
-                    powers.append([j , k])
-                    k+=1
-                    counter+=1
-        self.X = X
-        self.powers = powers
-        self.number_basis_elts = number_basis_elts
-        self.invXTX = linalg.inv(np.matmul(np.transpose(X),X))
+        # Flattening f column by column, so that z[i*n+j] = f(x_i, y_j) = f[j,i]. The 1-1 correspondence
+        # {counter} <-> {(i,j)} is saved for later
+        self.z = np.ravel(f, order='F').astype(float)
+        self.correspondence = np.column_stack((np.repeat(np.arange(m), n), np.tile(np.arange(n), m)))
+
+        # Make X. With basis = 'legendre' or 'chebyshev' the columns are products of orthogonal polynomials
+        # on [0,1] instead of monomials, which keeps X well conditioned for high degrees (see basis_table)
+        self.X = X = grid_design_matrix(x, y, degree, basis=basis)
+        self.powers = polynomial_powers(degree, graded=False)
+        self.number_basis_elts = len(self.powers) #(degree+1)th triangular number (number of basis elements for R[x,y] of degree <= degree)
+        self._invXTX = None
+        self.solver = 'auto' # least square solver used by get_beta, see "solve" in regression.py
+        self.solver_log = [] # which solver ran, and how long it took, for every call of get_beta
+        self._svd = None
+        self._gram = None
+
+    @property
+    def invXTX(self):
+        '''inv(X^TX), only computed the first time it is needed (see var_covar_matrix).'''
+        if self._invXTX is None:
+            self._invXTX = linalg.inv(np.matmul(np.transpose(self.X),self.X))
+        return self._invXTX
+
+    @property
+    def svd(self):
+        '''Thin SVD (U, s, VT) of X, only computed the first time it is needed (see ridge_path).'''
+        if self._svd is None:
+            self._svd = linalg.svd(self.X, full_matrices=False)
+        return self._svd
+
+    @property
+    def gram(self):
+        '''Normal equations (X^TX, X^Tz, z^Tz), only computed the first time they are needed (see lasso_path).'''
+        if self._gram is None:
+            X = self.X; z = self.z
+            self._gram = (np.matmul(np.transpose(X),X), np.matmul(np.transpose(X),z), np.dot(z,z))
+        return self._gram
 
     # Regression
     def get_reg(self, *args):
@@ -230,81 +198,105 @@ class regdata:
         '''Returns coefficients for a given beta as a numpy array, found using either ordinary least square,
         Ridge or Lasso regression depending on the arguments. If *args is empty, then beta is found using
         ordinary least square. If *args contains a number it will be treated as a bias LAMBDA for a Ridge regression.
+        OLS and Ridge are solved with the solver self.solver ('auto' picks Cholesky, QR or SVD from the
+        conditioning of the problem), and the solver that ran is logged in self.solver_log.
         If *args contains two numbers, then the first will count as a LAMBDA and the second as a tolerance epsilon.
-        In this case beta is found using a shooting algorithm that runs until it converges up to the set tolerance.
+        In this case beta is found using coordinate descent (the shooting algorithm) on the normal equations, started
+        from the Ridge solution as before and finished by a feature-sign search, which runs until the relative duality
+        gap is below epsilon. See "lasso_path" in regression.py.
         '''
 
-        XT = np.transpose(X)
-        beta = np.matmul(XT,X)                   
-        if len(args) >= 1: #Ridge parameter LAMBDA
-            LAMBDA = args[0] 
-            beta[np.diag_indices_from(beta)]+=LAMBDA
-        beta = SVDinv(beta)
-        beta = np.matmul(beta,XT)
-        beta = np.matmul(beta,z)
-
         #Shooting algorithm for Lasso
         if len(args)>=2:
-            epsilon = args[1]
-            D = self.number_basis_elts
-            ints = np.arange(0,D,1)
-            beta_old = 0.0
-            while np.linalg.norm(beta-beta_old)>=epsilon:
-                beta_old = np.copy(beta)
-                for j in range(0,D):
-                    aj = 2*np.sum(X[:,j]**2)
-                    no_j = ints[np.arange(D)!=j]
-                    cj = 2*np.sum(np.multiply(X[:,j],(z-np.matmul(X[:,no_j],beta[no_j]))))
-                    if cj<-LAMBDA:
-                        beta[j]=(cj+LAMBDA)/aj
-                    elif cj > LAMBDA:
-                        beta[j]=(cj-LAMBDA)/aj
-                    else:
-                        beta[j]=0.0
+            LAMBDA, epsilon = args[0], args[1]
+            return lasso_path(X,z,LAMBDA,tol=epsilon)['beta'][:,0]
+
+        LAMBDA = args[0] if len(args) >= 1 else 0.0 #Ridge parameter LAMBDA
+        beta, info = solve(X,z,LAMBDA,self.solver)
+        self.solver_log.append(info)
         return beta
 
+    # Ridge regularization path
+    def ridge_path(self, lambdas, return_fit = False):
+        '''Returns the Ridge fits for a whole vector of lambdas as a dictionary, based on one SVD of X.
+        The dictionary contains the coefficients 'beta' (one column per LAMBDA) and the arrays 'R2', 'MSE',
+        'bias', 'variance' and 'extra_term' with one score per LAMBDA. If return_fit is True, it also contains
+        'fit', an array of the fitted surfaces (one per LAMBDA) matching the grid xm, ym. LAMBDA = 0 gives
+        the ordinary least square fit. See "ridge_path" in regression.py for details.
+        '''
+        path = ridge_path(self.X, self.z, lambdas, svd=self.svd)
+        if return_fit:
+            path['fit'] = self.model(path['beta'])
+        return path
+
+    # Leave-one-out cross validation
+    def loocv(self, lambdas):
+        '''Returns the exact leave-one-out (LOOCV) and generalized (GCV) cross validation errors of
+        Ridge regression for a whole vector of lambdas (LAMBDA = 0 is ordinary least square) as a dictionary.
+        This is the k = mn limit of k_cross_validation, but it is computed from the SVD of X without any refits.
+        See "ridge_loocv" in regression.py for details.
+        '''
+        return ridge_loocv(self.X, self.z, lambdas, svd=self.svd)
+
+    # Lasso regularization path
+    def lasso_path(self, lambdas, epsilon = 0.001):
+        '''Returns the Lasso fits for a whole vector of lambdas as a dictionary, like ridge_path. The lambdas
+        are solved in decreasing order by coordinate descent on the normal equations of X, each one warm started
+        from the previous solution. epsilon is the tolerance on the relative duality gap.
+        See "lasso_path" in regression.py for details.
+        '''
+        G, b, zz = self.gram
+        X = self.X; z = self.z; mn = self.mn #relabeling self variables
+        path = lasso_path(X, z, lambdas, tol=epsilon, gram=self.gram)
+        path.update(gram_scores(G, b, zz, np.sum(z), np.sum(X, axis=0), mn, path['beta']))
+        return path
+
     # Get model given beta
     def model(self,beta):
         '''Returns heigh values based on the coefficients beta as a matrix
         that matches the grid xm, ym. The degree of the polynomial equals self.degree.
+        The grid is evaluated as a product of the power tables of x and y with the coefficients. If beta
+        has one column per model, an array with one surface per model is returned.
         '''
-        xm = self.xm; ym = self.ym; degree = self.degree #relabeling self variables
-        s=0
-        counter = 0
-        # loop that adds terms of the form beta*x^j*y^k such that j+k<=5
-        for j in range(0,degree + 1):
-            k = 0
-            while j+k <= degree: 
-                s+= beta[counter]*(xm**j)*(ym**k)
-                counter +=1
-                k+=1
-        return s
-
-    def get_data_partition(self,k):
+        x = self.x; y = self.y; degree = self.degree #relabeling self variables
+        return grid_surface(x, y, beta, degree, graded=False, basis=self.basis)
+
+    def monomial_beta(self, beta):
+        '''Returns the coefficients beta (in the basis self.basis) as coefficients of the monomials x^i*y^j,
+        ordered as self.powers.
+        '''
+        return monomial_coefficients(beta, self.degree, self.basis, graded=False)
+
+    def get_data_partition(self,k, seed = None):
         ''' Creates a random partition of k (almost) equally sized parts of the array
-        {1,2,...,mn}. This can be used to make training/testing data.
+        {1,2,...,mn}, as a list of k integer arrays. This can be used to make training/testing data.
+        Passing a seed gives the same partition every time.
         '''
-        mn =  self.mn; correspondence = self.correspondence
-        indices = np.arange(mn)
-        indices_shuffle = np.arange(mn)
-        np.random.shuffle(indices_shuffle)
-        partition = []
-        for step in range(0,k):
-            part = list(indices_shuffle[step:mn:k])
-            #part = [correspondence[i] for i in part]
-            partition.append(part) 
-        return partition
+        return fold_indices(self.mn, k, seed=seed)
 
     def bootstrap_step(self, samplesize, *args):
         '''Finds and returns the coefficient that determines a model (ols, Ridge or Lasso),
         depending on args*.
         '''
         mn =  self.mn; X = self.X; z = self.z;  #relabeling self variables
-        integers = np.random.randint(low=0, high=mn-1, size=samplesize)
-        znew =  z[integers]
-        Xnew = X[integers,:]
-        betanew = self.get_beta(Xnew,znew,*args)
-        return betanew
+        # the resample is represented by how many times each point is drawn, so X[integers,:] is never formed
+        integers = np.random.randint(low=0, high=mn, size=samplesize)
+        w = np.bincount(integers, minlength=mn).astype(float)
+        XTW = np.transpose(X)*w
+        G = np.matmul(XTW,X); b = np.matmul(XTW,z)
+        if len(args) >= 2: # Lasso
+            return lasso_path(None, None, args[0], tol=args[1], gram=(G, b, np.dot(w*z,z)))['beta'][:,0]
+        if len(args) >= 1: # Ridge
+            G[np.diag_indices_from(G)] += args[0]
+        return linalg.lstsq(G,b)[0]
+
+    def bootstrap(self, n_bootstraps, LAMBDA = 0.0, samplesize = None):
+        '''Bootstrap of the OLS (LAMBDA = 0) or Ridge fit, where the replicates are solved in stacked batches
+        from their resampling weights. Returns a dictionary with the MSE, bias and variance of the fitted
+        surfaces compared to f (see "bootstrap" in regression.py).
+        '''
+        X = self.X; z = self.z #relabeling self variables
+        return bootstrap(X, z, n_bootstraps, X, z, LAMBDA, samplesize)
 
     # Variance/ covariance matrix
     def var_covar_matrix(self,reg):
@@ -389,6 +381,15 @@ def numerical_error(data,LAMBDA):
 
 #================================================================================================================
 
+def cached_fit(data, method, compute, **params):
+    ''' Returns compute(), a fit of the regdata object data, through the on-disk result cache if it is enabled (see
+    "cached_result" in regression.py, off by default). The key is made of the surface data.f, the degree, basis and solver of data, the name of the
+    method and params (e.g. LAMBDA or the partition), so rerunning a study only reads the stored results.
+    '''
+    return cached_result(compute, f=data.f, degree=data.degree, basis=data.basis, solver=data.solver, method=method, **params)
+
+#================================================================================================================
+
 def plot_R2_scores(data,Nstart,Nstop,name, epsilon = 0.001):
     ''' This function makes a plot of the R2 scores vs Lambda of the different regression methods,
     for a given dataset.'''
@@ -399,13 +400,10 @@ def plot_R2_scores(data,Nstart,Nstop,name, epsilon = 0.001):
     R2_ols = np.zeros(N)
     R2_Ridge = np.zeros(N)
     R2_Lasso = np.zeros(N)
-    for i in range(0,N):
-        LAMBDA = 10**(Nstart+i)
-        lambdas[i]=LAMBDA
-        R2_ols[i]=R2(f, data.get_reg())
-        R2_Ridge[i]=R2(f, data.get_reg(LAMBDA))
-        R2_Lasso[i]=R2(f, data.get_reg(LAMBDA,epsilon))
-        print("Completed lambda: ", LAMBDA, " Completion: {:.1%}".format(float(i)/(N-1)))
+    lambdas[:] = 10.0**(Nstart+np.arange(N))
+    R2_ols[:] = cached_fit(data, 'ridge_path', lambda: data.ridge_path(0), lambdas=0)['R2'] # OLS does not depend on LAMBDA
+    R2_Ridge[:] = cached_fit(data, 'ridge_path', lambda: data.ridge_path(lambdas), lambdas=lambdas)['R2']
+    R2_Lasso[:] = cached_fit(data, 'lasso_path', lambda: data.lasso_path(lambdas, epsilon), lambdas=lambdas, epsilon=epsilon)['R2']
     plotitle = '$R^2$ score of degree {} polynomial fit on {}'.format(degree,name)
     plt.figure()
     plt.plot(np.log10(lambdas),R2_ols)
@@ -421,51 +419,31 @@ def plot_R2_scores(data,Nstart,Nstop,name, epsilon = 0.001):
 
 #================================================================================================================
 
-def plot_R2_scores_k_cross_validation(data,Nstart,Nstop,k,name, epsilon = 0.001):
+def plot_R2_scores_k_cross_validation(data,Nstart,Nstop,k,name, epsilon = 0.001, seed = None, n_jobs = 1):
     ''' This function makes a plot of the R2 scores vs LAMBDA of the best iteration from a k-fold cross validation on 
     the data set from the given data. Best in the sense that the fit had the highest R2 score on testing data. The same 
     partition of the data set is used for each lambda, and each time we select the best training data on which we base the model.
-    See "k_cross_validation" for more details.'''
+    See "k_cross_validation" for more details. The folds are drawn with the given seed, see "get_data_partition".
+    With n_jobs > 1 (None: all cores) the methods run in a pool of processes, which needs the calling script's code
+    under if __name__ == '__main__' (see "grid_study" in regression.py).'''
 
     degree = data.degree; f = data.f # obtaining class data
     N = Nstop-Nstart # number of lambdas
 
     # Comparing R2 scores, regression with fixed degree, variable LAMBDA
-    lambdas = np.zeros(N)
-    partition = data.get_data_partition(k)
-    kval = k_cross_validation(data,partition)
-    kval.R2()
-    
-    R2_Lasso_test_data = np.zeros(N)
-    R2_Lasso_training_data = np.zeros(N)
-    R2_Ridge_test_data = np.zeros(N)
-    R2_Ridge_training_data = np.zeros(N)
-
-    # OLS R2 score
-    R2score_ols_test, R2score_ols_train = kval.test_R2, kval.train_R2
-    R2_ols_test_data = np.ones(N)*R2score_ols_test
-    R2_ols_training_data = np.ones(N)*R2score_ols_train
-
-    for i in range(0,N): 
-        LAMBDA = 10**(Nstart+i)
-        lambdas[i]=LAMBDA
-        kval = k_cross_validation(data,partition,LAMBDA)
-        kval.R2()
-
-        # Ridge R2 score
-        R2score_ridge_test, R2score_ridge_train = kval.test_R2, kval.train_R2
-        R2_Ridge_test_data[i] = R2score_ridge_test
-        R2_Ridge_training_data[i] = R2score_ridge_train
-
-        kval = k_cross_validation(data,partition,LAMBDA,epsilon)
-        kval.R2()
-
-        # Lasso R2 score
-        R2score_lasso_test, R2score_lasso_train = kval.test_R2, kval.train_R2
-        R2_Lasso_test_data[i] = R2score_lasso_test
-        R2_Lasso_training_data[i] = R2score_lasso_train
-
-        print("Completed lambda: ", LAMBDA, " Completion: {:.1%}".format(float(i)/(N-1)))
+    lambdas = 10.0**(Nstart+np.arange(N))
+    partition = data.get_data_partition(k, seed)
+
+    # OLS, Ridge and Lasso R2 scores for all lambdas and folds as one grid study, in n_jobs processes
+    # (see "grid_study" in regression.py)
+    study = cached_fit(data, 'grid_study', lambda: grid_study(data.x, data.y, data.z, degree, lambdas, partition, grid=True,
+                       basis=data.basis, tol=epsilon, n_jobs=n_jobs), lambdas=lambdas, partition=partition, epsilon=epsilon)
+    R2_ols_test_data = np.ones(N)*grid_mean(study, 'test_R2', 'ols')[1]
+    R2_ols_training_data = np.ones(N)*grid_mean(study, 'train_R2', 'ols')[1]
+    R2_Ridge_test_data = grid_mean(study, 'test_R2', 'ridge', by='lambda')[1]
+    R2_Ridge_training_data = grid_mean(study, 'train_R2', 'ridge', by='lambda')[1]
+    R2_Lasso_test_data = grid_mean(study, 'test_R2', 'lasso', by='lambda')[1]
+    R2_Lasso_training_data = grid_mean(study, 'train_R2', 'lasso', by='lambda')[1]
 
     plotitle = '$R^2$ scores of degree {} polynomial fit on {}, $k=${}'.format(degree,name,k)
     plt.figure()
@@ -494,18 +472,32 @@ def plot_R2_scores_k_cross_validation(data,Nstart,Nstop,k,name, epsilon = 0.001)
 
 #================================================================================================================
 
+def get_degree_path(f, degend, LAMBDA = 0, basis = 'monomial'):
+    ''' Returns the OLS (LAMBDA = 0) or Ridge fits of f for all degrees 0,...,degend, based on a single
+    factorization of the design matrix of degree degend. See "degree_path" in regression.py.
+    The returned dictionary contains R2, MSE, bias, variance and extra terms indexed by degree.
+    basis = 'legendre' or 'chebyshev' keeps the path stable for high degrees.
+    The path is read through the on-disk result cache if it is enabled (see "cached_result" in regression.py).
+    '''
+    m = len(f[0,:]); n = len(f)
+    x = np.linspace(0, 1, m); y = np.linspace(0, 1, n)
+    compute = lambda: degree_path(x, y, np.ravel(f, order='F'), degend, LAMBDA, grid=True, basis=basis)
+    return cached_result(compute, f=f, degree=degend, LAMBDA=LAMBDA, basis=basis, method='degree_path', solver='qr')
+
+#================================================================================================================
+
 def plot_R2_complexity(degstart,degend,degstep,f,name, LAMBDA = 0.00001, epsilon = 0.001):
     ''' Comparing R2 scores, regression with fixed LAMBDA, variable degree as well as variance and Bias
     Plotting the result.
     '''
     degrees = np.arange(degstart,degend+1,degstep)
     N = len(degrees)
-    R2_ols, R2_Ridge, R2_Lasso = np.zeros(N), np.zeros(N), np.zeros(N)
+    R2_ols = get_degree_path(f,degend)['R2'][degrees]
+    R2_Ridge = get_degree_path(f,degend,LAMBDA)['R2'][degrees]
+    R2_Lasso = np.zeros(N)
     for i, degree in enumerate(degrees):
         data_f = regdata(f,degree)
-        R2_ols[i]=R2(f, data_f.get_reg())
-        R2_Ridge[i]=R2(f, data_f.get_reg(LAMBDA))
-        R2_Lasso[i]=R2(f, data_f.get_reg(LAMBDA,epsilon))
+        R2_Lasso[i]=R2(f, cached_fit(data_f, 'lasso', lambda: data_f.get_reg(LAMBDA,epsilon), LAMBDA=LAMBDA, epsilon=epsilon))
         print("Completed degree: ", degree, " Completion: {:.1%}".format(float(i)/(N-1)))
     plotitle = '$R^2$ score of polynomial fit on {} with $\lambda=${}'.format(name,LAMBDA)
     plt.figure()
@@ -522,31 +514,36 @@ def plot_R2_complexity(degstart,degend,degstep,f,name, LAMBDA = 0.00001, epsilon
 
 #================================================================================================================
 
-def plot_MSE_variance(degstart, degend, degstep, f, LAMBDA = 0.01, epsilon = 0.001, k=10):
+def plot_MSE_variance(degstart, degend, degstep, f, LAMBDA = 0.01, epsilon = 0.001, k=10, seed = None, n_jobs = 1):
     # Comparing MSE, bias, variance and additional terms as function of complexity.
+    # The cross validation studies run in n_jobs processes, see plot_R2_scores_k_cross_validation.
     degrees = np.arange(degstart,degend+1,degstep)
     N = len(degrees)
     data = regdata(f,5)
     fvar = np.zeros(N); fbias = np.zeros(N); fMSE = np.zeros(N); fextra_terms = np.zeros(N)
+    keys = ('test_variance','test_bias','test_MSE','test_extra_term')
 
     # function for plotting
     def makeplot(methodname, *args, partition = None):
         print(methodname)
-        for i, degree in enumerate(degrees):
-            data = regdata(f,degree)
-            if partition == None:
-                freg = data.get_reg(*args)
+        if partition == None and len(args) < 2:
+            # OLS and Ridge: all degrees from one factorization
+            path = get_degree_path(f, degend, *args)
+            fvar[:], fbias[:], fMSE[:], fextra_terms[:] = (path[key][degrees] for key in ('variance','bias','MSE','extra_term'))
+        elif partition is not None:
+            # cross validation: all degrees as one grid study, in n_jobs processes (see "grid_study" in regression.py)
+            method = GRID_METHODS[min(len(args), 2)]
+            tol = args[1] if len(args) >= 2 else 1e-4
+            study = cached_result(lambda: grid_study(data.x, data.y, data.z, degrees, args[:1] or 0.0, partition, [method],
+                                  grid=True, tol=tol, n_jobs=n_jobs), f=f, degree=degrees, LAMBDA=args[:1] or 0.0, partition=partition,
+                                  epsilon=tol, method='grid_study_'+method)
+            fvar[:], fbias[:], fMSE[:], fextra_terms[:] = (grid_mean(study, key, method)[1] for key in keys)
+        else:
+            for i, degree in enumerate(degrees):
+                data_d = regdata(f,degree)
+                freg = cached_fit(data_d, 'get_reg', lambda: data_d.get_reg(*args), args=args)
                 fvar[i], fbias[i], fMSE[i], fextra_terms[i] =  var(freg), bias(f,freg), MSE(f,freg), extra_term(f,freg)
-            else:
-                kval = k_cross_validation(data, partition, *args)
-                kval.MSE()
-                fvar[i] = kval.test_var
-                fbias[i] = kval.test_bias
-                fMSE[i] = kval.test_MSE
-                fextra_terms[i] =kval.test_extra_terms
-
-                #fvar[i], fbias[i], fMSE[i], fextra_terms[i], train_var, train_bias, train_MSE, train_extra_terms 
-            print("Completed degree: ", degree, " Completion: {:.1%}".format(float(degree-degstart)/(degend-degstart)))
+                print("Completed degree: ", degree, " Completion: {:.1%}".format(float(degree-degstart)/(degend-degstart)))
         plt.figure() 
         plt.plot(degrees, fvar)
         plt.plot(degrees, fbias)
@@ -574,7 +571,7 @@ def plot_MSE_variance(degstart, degend, degstep, f, LAMBDA = 0.01, epsilon = 0.0
     #plt.title("Error of lasso regression, $\lambda=${}".format(LAMBDA))
 
     # k-cross validation
-    partition_ = data.get_data_partition(k)
+    partition_ = data.get_data_partition(k, seed)
 
     # Ordinary least square plot
     # makeplot("Ordinary least squares {}-fold cross validation".format(k), partition = partition_)
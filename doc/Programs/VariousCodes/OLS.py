@@ -23,7 +23,7 @@ z_noise = z + np.random.normal(scale = 1, size = (N,N))
 
 # Perform regression
 X = create_X(x_mesh_, y_mesh_, n=n)
-model = OLS()
+model = OLS(solver = 'sketch') # randomized sketch-and-precondition solver, X^TX is never formed
 beta = model.fit(X, z_noise, ret=True)
 
 # Perform regression with Scikit learn using ridge with alpha = 0
@@ -35,6 +35,8 @@ model2.fit(X, np.ravel(z_noise))
 print('============================')
 print('Calculated beta-values:', beta)
 print('Scikit-learn beta-values:', model2.coef_)
+print('Sketched solve: %d LSQR iterations on a %d row sketch, %.2f s' %(model.info['iterations'], model.info['rows'], model.info['time']))
+print('Relative error against the exact solve: %.2e' %(np.linalg.norm(beta - model2.coef_)/np.linalg.norm(model2.coef_)))
 
 # Create best-fit matrix for plotting
 x_r = np.linspace(0,1,N)
@@ -1,6 +1,7 @@
 import sys
 import numpy as np
 from matplotlib import cm
+from regression import design_matrix
 """
 A file for all common functions used in project 1
 """
@@ -28,25 +29,14 @@ def R2_Score(y, y_tilde):
 
 	return 1 - np.sum((y[:-2]-y_tilde[:-2])**2)/np.sum((y[:-2]-np.average(y))**2)
 
-def create_X(x, y, n = 5):
+def create_X(x, y, n = 5, basis = 'monomial'):
 	"""
 	Function for creating a X-matrix with rows [1, x, y, x^2, xy, xy^2 , etc.]
 	Input is x and y mesh or raveled mesh, keyword agruments n is the degree of the polinomial you want to fit.
+	basis = 'legendre' or 'chebyshev' replaces the powers by orthogonal polynomials on [0,1].
+	The matrix is built and memoized by the shared engine in regression.py, so it is read-only.
 	"""
-	if len(x.shape) > 1:
-		x = np.ravel(x)
-		y = np.ravel(y)
-
-	N = len(x)
-	l = int((n+1)*(n+2)/2)		# Number of elements in beta
-	X = np.ones((N,l))
-
-	for i in range(1,n+1):
-		q = int((i)*(i+1)/2)
-		for k in range(i+1):
-			X[:,q+k] = (x**(i-k))*(y**k)
-
-	return X
+	return design_matrix(x, y, n, basis=basis)
 
 
 def plot_surface(x, y, z, title = "", show = False, cmap=cm.coolwarm, figsize = None):
@@ -128,10 +118,12 @@ def K_fold(x,y,z,k,alpha,model,m=5, ret_std = False):
 	Variance_=0
 	Bias_=0
 	betas = np.zeros((k,int((m+1)*(m+2)/2)))
+	X_all = create_X(x,y,n=m)	# built once, the folds are row subsets
 	for t in range(k):
-		x_,y_,z_,x_test,y_test,z_test=train_test_data(x,y,z,i[t*n_k:(t+1)*n_k])
-		X= create_X(x_,y_,n=m)
-		X_test= create_X(x_test,y_test,n=m)
+		test = i[t*n_k:(t+1)*n_k]
+		train = np.delete(np.arange(n),test)
+		X, z_ = X_all[train], z[train]
+		X_test, z_test = X_all[test], z[test]
 
 
 		model.fit(X,z_)
@@ -0,0 +1,1331 @@
+"""
+Shared regression engine for the polynomial fits of project 1 (Methods.py, functions.py and
+the scripts building on them). The design matrices are built here once and reused.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import linalg
+from scipy.linalg import lapack
+
+#================================================================================================================
+
+# Polynomial basis
+
+def polynomial_powers(degree, graded = True):
+    """
+    Returns the exponents (j,k) of the monomials x^j*y^k with j+k <= degree as an integer array
+    of shape (p,2). With graded=True the monomials are ordered by total degree,
+    [1, x, y, x^2, xy, y^2, ...], which is the column order of create_X. With graded=False
+    they are ordered by the power of x first, [1, y, y^2, ..., x, xy, ...], which is the
+    column order used by regdata in Methods.py.
+    """
+    if graded:
+        powers = [(i-k, k) for i in range(degree+1) for k in range(i+1)]
+    else:
+        powers = [(j, k) for j in range(degree+1) for k in range(degree+1-j)]
+    return np.array(powers, dtype=int).reshape(-1, 2)
+
+
+def power_table(x, degree):
+    """
+    Returns the array T of shape (len(x), degree+1) with T[:,k] = x^k. Every power is
+    obtained from the previous one, x^k = x^(k-1)*x, so no exponentiation is done.
+    """
+    x = np.ravel(x)
+    T = np.empty((len(x), degree+1))
+    T[:,0] = 1.0
+    for k in range(1, degree+1):
+        np.multiply(T[:,k-1], x, out=T[:,k])
+    return T
+
+
+BASES = ('monomial', 'legendre', 'chebyshev')
+
+def basis_table(x, degree, basis = 'monomial', domain = (0, 1)):
+    """
+    Returns the array T of shape (len(x), degree+1) with T[:,k] = phi_k(x), the kth 1D basis polynomial.
+    For basis='monomial' this is power_table. For 'legendre' and 'chebyshev', x is first mapped from domain
+    to [-1,1], and the polynomials are built by their three-term recurrences. The tensor products of these
+    polynomials are nearly orthogonal on uniform grids, so the design matrices stay well conditioned
+    at high degrees.
+    """
+    if basis == 'monomial':
+        return power_table(x, degree)
+    if basis not in BASES:
+        raise ValueError("Unknown basis {}, use one of {}".format(basis, BASES))
+    t = (2*np.ravel(x) - (domain[0] + domain[1]))/(domain[1] - domain[0])
+    T = np.empty((len(t), degree+1))
+    T[:,0] = 1.0
+    if degree >= 1:
+        T[:,1] = t
+    for k in range(1, degree):
+        if basis == 'legendre':
+            T[:,k+1] = ((2*k+1)*t*T[:,k] - k*T[:,k-1])/(k+1)
+        else:
+            T[:,k+1] = 2*t*T[:,k] - T[:,k-1]
+    return T
+
+
+def monomial_coefficients(beta, degree, basis = 'monomial', graded = True, domain = (0, 1)):
+    """
+    Converts coefficients beta in the given basis (see basis_table) to the coefficients of the monomials
+    x^j*y^k, in the same ordering, so that fits in any basis can be exported and compared. Each 1D basis
+    is expanded in powers of t, and t = (2x - (a+b))/(b-a) is expanded in powers of x.
+    """
+    if basis == 'monomial':
+        return np.array(beta, dtype=float)
+    from numpy.polynomial import legendre, chebyshev
+    to_power = legendre.leg2poly if basis == 'legendre' else chebyshev.cheb2poly
+    A = np.zeros((degree+1, degree+1)) # column k: coefficients of phi_k in powers of t
+    for k in range(degree+1):
+        A[:k+1,k] = to_power(np.identity(degree+1)[k,:k+1])
+    a, b = domain
+    alpha, shift = 2.0/(b - a), -(a + b)/(b - a) # t = alpha*x + shift
+    from scipy.special import comb
+    S = np.zeros((degree+1, degree+1)) # column k: coefficients of t^k in powers of x
+    for k in range(degree+1):
+        i = np.arange(k+1)
+        S[i,k] = comb(k, i)*alpha**i*shift**(k-i)
+    A = S @ A
+    C = A @ coefficient_matrix(beta, degree, graded) @ A.T
+    powers = polynomial_powers(degree, graded)
+    result = C[:,powers[:,1],powers[:,0]].T
+    return result[:,0] if np.ndim(beta) == 1 else result
+
+#================================================================================================================
+
+# Memoization of design matrices
+
+DESIGN_CACHE_BYTES = 2**28 # total size of the design matrices kept in memory; larger matrices are not kept
+_design_cache = OrderedDict()
+
+def _array_key(a):
+    a = np.ascontiguousarray(a, dtype=float)
+    return (a.shape, hashlib.sha1(a).hexdigest())
+
+def _cached(key, build):
+    """
+    Looks up key in the design matrix cache, and builds (and stores) the matrix if it is missing.
+    The least recently used matrices are dropped while the cache holds more than DESIGN_CACHE_BYTES,
+    and a matrix larger than that on its own is returned without being stored. Cached matrices are
+    read-only, since they are shared between all callers.
+    """
+    if key in _design_cache:
+        _design_cache.move_to_end(key)
+        return _design_cache[key]
+    X = build()
+    if X.nbytes > DESIGN_CACHE_BYTES:
+        return X
+    X.flags.writeable = False
+    _design_cache[key] = X
+    while sum(A.nbytes for A in _design_cache.values()) > DESIGN_CACHE_BYTES:
+        _design_cache.popitem(last=False)
+    return X
+
+def clear_design_cache():
+    """
+    Empties the design matrix cache.
+    """
+    _design_cache.clear()
+
+#================================================================================================================
+
+# Design matrices
+
+def design_matrix(x, y, degree, graded = True, cache = True, basis = 'monomial'):
+    """
+    Returns the design matrix of the 2D polynomial basis of the given degree, evaluated at the
+    points (x_i, y_i). x and y may be meshes, in which case they are raveled. The columns are
+    ordered as described in polynomial_powers. The result is memoized on (x, y, degree, graded, basis)
+    unless cache=False. basis selects the 1D polynomials (see basis_table).
+    """
+    x = np.ravel(x); y = np.ravel(y)
+
+    def build():
+        powers = polynomial_powers(degree, graded)
+        Tx = basis_table(x, degree, basis); Ty = basis_table(y, degree, basis)
+        return Tx[:,powers[:,0]]*Ty[:,powers[:,1]]
+
+    if not cache:
+        return build()
+    key = ('points', degree, graded, basis, _array_key(x), _array_key(y))
+    return _cached(key, build)
+
+
+def grid_design_matrix(x, y, degree, graded = False, cache = True, basis = 'monomial'):
+    """
+    Returns the design matrix of the 2D polynomial basis evaluated on the tensor grid spanned by the
+    1D arrays x (length m) and y (length n). Row i*n+j corresponds to the point (x_i, y_j), which
+    matches the ordering used by regdata. Only the 1D power tables are computed, each column is
+    an outer product of a power of x and a power of y.
+    """
+    x = np.ravel(x); y = np.ravel(y)
+
+    def build():
+        powers = polynomial_powers(degree, graded)
+        Tx = basis_table(x, degree, basis); Ty = basis_table(y, degree, basis)
+        X = Tx[:,None,powers[:,0]]*Ty[None,:,powers[:,1]]
+        return X.reshape(len(x)*len(y), len(powers))
+
+    if not cache:
+        return build()
+    key = ('grid', degree, graded, basis, _array_key(x), _array_key(y))
+    return _cached(key, build)
+
+#================================================================================================================
+
+# Evaluation on grids
+
+def coefficient_matrix(beta, degree, graded = True):
+    """
+    Rearranges the coefficients beta of the polynomial basis (ordered as in polynomial_powers) into the matrix
+    C with C[k,j] = coefficient of x^j*y^k. If beta has one model per column, C has shape (L, degree+1, degree+1).
+    """
+    powers = polynomial_powers(degree, graded)
+    beta = np.reshape(beta, (len(powers), -1))
+    C = np.zeros((beta.shape[1], degree+1, degree+1))
+    C[:,powers[:,1],powers[:,0]] = beta.T
+    return C
+
+
+def grid_surface(x, y, beta, degree, graded = True, basis = 'monomial'):
+    """
+    Evaluates the polynomial with coefficients beta on the grid spanned by the 1D arrays x (length m) and
+    y (length n), and returns it as an (n,m) matrix matching np.meshgrid(x,y). The surface is the product
+    Vy C Vx^T of the power tables of y and x and the coefficient matrix (see coefficient_matrix), which costs
+    O(degree*m*n) instead of evaluating every monomial on the whole grid. If beta has one model per column
+    (e.g. bootstrap replicates or a LAMBDA path), all surfaces are evaluated in one call and returned with
+    shape (L, n, m). basis selects the 1D polynomials (see basis_table).
+    """
+    Vx = basis_table(x, degree, basis); Vy = basis_table(y, degree, basis)
+    surfaces = Vy @ coefficient_matrix(beta, degree, graded) @ Vx.T
+    return surfaces[0] if np.ndim(beta) == 1 else surfaces
+
+#================================================================================================================
+
+# Scores
+
+def scores(f_true, f_model):
+    """
+    Returns a dictionary with the R2 score, MSE, bias, variance and the extra (cross) term of the
+    model f_model compared to f_true. The definitions match the functions in Methods.py, so that
+    MSE = bias + variance + extra_term. If f_model is a matrix with one model per column
+    (e.g. one per LAMBDA), each score is an array with one entry per column. f_true can then also
+    be a matrix of the same shape, with the true values of every model in its column.
+    """
+    if np.ndim(f_true) == 2 and np.shape(f_true) == np.shape(f_model):
+        F_true = np.asarray(f_true)
+    else:
+        F_true = np.ravel(f_true)[:,None]
+    F = np.reshape(f_model, (len(F_true), -1))
+    f_model_mean = np.mean(F, axis=0)
+    residual = F_true - F
+    result = {'R2': 1.0 - np.sum(residual**2, axis=0)/np.sum((F_true - np.mean(F_true, axis=0))**2, axis=0),
+              'MSE': np.mean(residual**2, axis=0),
+              'bias': np.mean((F_true - f_model_mean)**2, axis=0),
+              'variance': np.mean((F - f_model_mean)**2, axis=0),
+              'extra_term': 2.0*np.mean((f_model_mean - F_true)*(F - f_model_mean), axis=0)}
+    if np.ndim(f_model) == 1:
+        result = {key: value[0] for key, value in result.items()}
+    return result
+
+#================================================================================================================
+
+# Least square solvers
+
+SOLVERS = ('auto', 'cholesky', 'qr', 'svd', 'lsqr', 'cg', 'sketch')
+CHOLESKY_CONDITION = 1e8 # largest estimated condition number of X^TX + LAMBDA*I solved by Cholesky
+
+def _targets(z, N):
+    """
+    Returns z as a vector, or as an (N, r) matrix with one target per column if it has N rows and two axes.
+    """
+    z = np.asarray(z, dtype=float)
+    return z if z.ndim == 2 and len(z) == N else np.ravel(z)
+
+
+def solve(X, z, LAMBDA = 0.0, solver = 'auto'):
+    """
+    Solves the OLS (LAMBDA = 0) or Ridge problem min |z - X beta|^2 + LAMBDA*|beta|^2 with the given solver:
+
+    'cholesky': Cholesky factorization of the normal equations, the fastest but squares the condition number.
+    'qr':       Householder QR of X (of [X; sqrt(LAMBDA) I] for Ridge), stable up to cond(X) ~ 1/eps.
+    'svd':      thin SVD of X, the slowest but handles rank deficient X: singular values below
+                eps*max(N, p) times the largest are dropped, as in np.linalg.lstsq (pseudo-inverse).
+    'lsqr':     iterative LSQR on X, only needs products with X and X^T.
+    'cg':       conjugate gradients on the normal equations.
+    'sketch':   randomized sketch-and-precondition LSQR for tall X, see sketched_lstsq.
+    'auto':     forms X^TX + LAMBDA*I and tries Cholesky. Its 1-norm condition number is estimated from the
+                Cholesky factor by LAPACK's dpocon, and if it is above CHOLESKY_CONDITION (or the factorization
+                fails) QR (or SVD) is used instead. Low degree fits thus get Cholesky, high degree fits the stable path.
+
+    z can be a matrix Z of shape (N, r), in which case all r problems are solved from one factorization
+    (for the iterative solvers, one preconditioner) and beta has shape (p, r). Any other z is flattened.
+
+    Returns beta and a dictionary with the 'solver' that ran, the 'time' it took in seconds and, for 'auto',
+    the estimated 'condition' number of X^TX + LAMBDA*I.
+    """
+    N, p = X.shape
+    z = _targets(z, N)
+    info = {'solver': solver}
+    start = time.perf_counter()
+    if solver == 'auto':
+        G = X.T @ X
+        G[np.diag_indices_from(G)] += LAMBDA
+        try:
+            R = linalg.cholesky(G, lower=False)
+            rcond, failed = lapack.dpocon(R, np.max(np.sum(np.abs(G), axis=0)))
+            info['condition'] = 1/rcond if failed == 0 and rcond > 0 else np.inf
+        except linalg.LinAlgError:
+            info['condition'] = np.inf
+        if info['condition'] < CHOLESKY_CONDITION:
+            info['solver'] = 'cholesky'
+            beta = linalg.cho_solve((R, False), X.T @ z)
+        else:
+            info['solver'] = 'qr' if np.isfinite(info['condition']) else 'svd'
+            beta = solve(X, z, LAMBDA, info['solver'])[0]
+    elif solver == 'cholesky':
+        G = X.T @ X
+        G[np.diag_indices_from(G)] += LAMBDA
+        beta = linalg.cho_solve(linalg.cho_factor(G), X.T @ z)
+    elif solver == 'qr':
+        if LAMBDA > 0:
+            X = np.vstack((X, np.sqrt(LAMBDA)*np.identity(p)))
+            z = np.concatenate((z, np.zeros((p,) + z.shape[1:])))
+        Q, R = np.linalg.qr(X)
+        beta = linalg.solve_triangular(R, Q.T @ z)
+    elif solver == 'svd':
+        U, s, VT = linalg.svd(X, full_matrices=False)
+        # singular values below eps*max(N, p)*s_max are treated as zero, the default rcond of np.linalg.lstsq
+        keep = s > np.finfo(float).eps*max(N, p)*(s[0] if len(s) else 0.0)
+        shrink = np.zeros_like(s)
+        shrink[keep] = s[keep]/(s[keep]**2 + LAMBDA)
+        beta = VT.T @ (shrink.reshape((p,) + (1,)*(z.ndim-1))*(U.T @ z))
+    elif solver == 'lsqr':
+        from scipy.sparse.linalg import lsqr
+        columns = z.T if z.ndim == 2 else [z]
+        beta = [lsqr(X, c, damp=np.sqrt(LAMBDA), atol=1e-12, btol=1e-12, iter_lim=10*p)[0] for c in columns]
+        beta = np.column_stack(beta) if z.ndim == 2 else beta[0]
+    elif solver == 'cg':
+        from scipy.sparse.linalg import cg
+        G = X.T @ X
+        G[np.diag_indices_from(G)] += LAMBDA
+        B = X.T @ z
+        columns = B.T if z.ndim == 2 else [B]
+        beta = [cg(G, c, rtol=1e-12, maxiter=10*p)[0] for c in columns]
+        beta = np.column_stack(beta) if z.ndim == 2 else beta[0]
+    elif solver == 'sketch':
+        beta, sketch_info = sketched_lstsq(X, z, LAMBDA)
+        info.update(sketch_info)
+    else:
+        raise ValueError("Unknown solver {}, use one of {}".format(solver, SOLVERS))
+    info['time'] = time.perf_counter() - start
+    return beta, info
+
+
+SKETCHES = ('gaussian', 'sparse', 'srht')
+
+def sketch_rows(A, m, sketch = 'sparse', rng = None, blocksize = 65536):
+    """
+    Returns S A for a random m x N matrix S with E[S^T S] = I, so that |S A v| ~ |A v| for all v when m is a
+    few times the number of columns of A. A is (N, q). The sketches are
+
+    'gaussian': S has independent N(0, 1/m) entries. The best embedding, but costs O(m N q). S is drawn in
+                blocks of rows of A, so it is never stored.
+    'sparse':   CountSketch, every row of A is added with a random sign to one random row of S A. Costs O(N q).
+    'srht':     subsampled randomized trigonometric transform, random signs followed by an orthonormal DCT of
+                every column and m uniformly sampled rows. Costs O(N q log N).
+    """
+    rng = np.random.default_rng(rng)
+    A = np.asarray(A, dtype=float)
+    N = len(A)
+    if sketch == 'gaussian':
+        SA = np.zeros((m,) + A.shape[1:])
+        for start in range(0, N, blocksize):
+            block = A[start:start+blocksize]
+            SA += rng.standard_normal((m, len(block))) @ block
+        return SA/np.sqrt(m)
+    elif sketch == 'sparse':
+        from scipy import sparse
+        S = sparse.csr_matrix((rng.choice((-1.0, 1.0), N), (rng.integers(0, m, N), np.arange(N))), shape=(m, N))
+        return np.asarray(S @ A)
+    elif sketch == 'srht':
+        from scipy.fft import dct
+        signs = rng.choice((-1.0, 1.0), N)
+        DA = dct(signs.reshape((N,) + (1,)*(A.ndim-1))*A, axis=0, norm='ortho')
+        return DA[rng.choice(N, m, replace=False)]*np.sqrt(N/m)
+    raise ValueError("Unknown sketch {}, use one of {}".format(sketch, SKETCHES))
+
+
+def sketched_lstsq(X, z, LAMBDA = 0.0, sketch = 'sparse', oversampling = 16, tol = 1e-12, max_iter = 100,
+                   exact = False, rng = None):
+    """
+    Solves min |z - X beta|^2 + LAMBDA*|beta|^2 for tall X (N >> p) by sketch-and-precondition
+    (Blendenpik/LSRN): the sketch S X with m = oversampling*p rows (see sketch_rows) is QR factorized,
+    S X = Q R. The sketch-and-solve estimate R^-1 Q^T S z starts LSQR on the preconditioned matrix X R^-1,
+    whose condition number is O(1) independent of cond(X), so LSQR converges to full accuracy in a few
+    products with X and X^T. X^TX is never formed.
+
+    Returns beta and a dictionary with the 'solver' ('sketch'), the 'sketch', its number of 'rows', the
+    relative 'sketch_error' of the sketch-and-solve estimate, the LSQR 'iterations' and the 'time'. With
+    exact = True, the exact solution (solve with 'qr') is computed as well and its 'exact_time' and the
+    relative 'error' |beta - beta_exact|/|beta_exact| are added. For a matrix z of shape (N, r) the sketch
+    and R are shared by the r problems, and 'iterations' is the largest LSQR count.
+    """
+    from scipy.sparse.linalg import LinearOperator, lsqr
+    start = time.perf_counter()
+    N, p = X.shape
+    z = _targets(z, N)
+    m = min(N, oversampling*p)
+    seed = np.random.default_rng(rng).integers(2**63) # the same S for X and z
+    SX, Sz = sketch_rows(X, m, sketch, seed), sketch_rows(z, m, sketch, seed)
+    if LAMBDA > 0:
+        SX = np.vstack((SX, np.sqrt(LAMBDA)*np.identity(p)))
+        Sz = np.concatenate((Sz, np.zeros((p,) + z.shape[1:])))
+    Q, R = np.linalg.qr(SX)
+    beta0 = linalg.solve_triangular(R, Q.T @ Sz)
+
+    # LSQR on [X; sqrt(LAMBDA) I] R^-1 y = [z; 0], y = R beta
+    sqrtL = np.sqrt(LAMBDA)
+    def matvec(y):
+        v = linalg.solve_triangular(R, np.ravel(y))
+        return np.concatenate((X @ v, sqrtL*v)) if LAMBDA > 0 else X @ v
+    def rmatvec(u):
+        u = np.ravel(u)
+        w = X.T @ u[:N] + (sqrtL*u[N:] if LAMBDA > 0 else 0)
+        return linalg.solve_triangular(R, w, trans='T')
+    rows = N + p if LAMBDA > 0 else N
+    A = LinearOperator((rows, p), matvec=matvec, rmatvec=rmatvec, dtype=float)
+    rhs = np.concatenate((z, np.zeros((p,) + z.shape[1:]))) if LAMBDA > 0 else z
+    if z.ndim == 2:
+        runs = [lsqr(A, rhs[:,i], atol=tol, btol=tol, iter_lim=max_iter, x0=R @ beta0[:,i]) for i in range(z.shape[1])]
+        y, iterations = np.column_stack([run[0] for run in runs]), max(run[2] for run in runs)
+    else:
+        y, istop, iterations = lsqr(A, rhs, atol=tol, btol=tol, iter_lim=max_iter, x0=R @ beta0)[:3]
+    beta = linalg.solve_triangular(R, y)
+    info = {'solver': 'sketch', 'sketch': sketch, 'rows': m, 'iterations': iterations,
+            'time': time.perf_counter() - start}
+    if exact:
+        beta_exact, exact_info = solve(X, z, LAMBDA, 'qr')
+        norm = np.linalg.norm(beta_exact)
+        info['exact_time'] = exact_info['time']
+        info['error'] = np.linalg.norm(beta - beta_exact)/norm
+        info['sketch_error'] = np.linalg.norm(beta0 - beta_exact)/norm
+    else:
+        info['sketch_error'] = np.linalg.norm(beta0 - beta)/np.linalg.norm(beta)
+    return beta, info
+
+
+class OLS:
+    """
+    Ordinary least square model with the fit/predict interface used by OLS.py and functions.K_fold.
+    The solver (see "solve") is chosen with the keyword solver, and info holds the solver that ran and its time.
+    """
+
+    def __init__(self, solver = 'auto'):
+        self.solver = solver
+        self.LAMBDA = 0.0
+        self.beta = None
+        self.info = None
+
+    def fit(self, X, z, ret = False):
+        self.beta, self.info = solve(X, z, self.LAMBDA, self.solver)
+        if ret:
+            return self.beta
+
+    def predict(self, X):
+        return X @ self.beta
+
+
+class Ridge(OLS):
+    """
+    Ridge model with penalty LAMBDA, otherwise as OLS.
+    """
+
+    def __init__(self, LAMBDA, solver = 'auto'):
+        OLS.__init__(self, solver)
+        self.LAMBDA = LAMBDA
+
+
+def multi_lstsq(X, Z, LAMBDA = 0.0, solver = 'auto', f_true = None):
+    """
+    Fits the same design matrix X to every column of Z (N, r), e.g. r noise realizations or data sets on
+    a shared grid, from one factorization of X (see solve). The scores (see "scores") of every fit are
+    computed against f_true, a common true surface of length N, or by default against its own column of Z.
+    Returns a dictionary with 'beta' of shape (p, r), the solver 'info' and the score arrays of length r.
+    """
+    Z = np.reshape(Z, (len(X), -1))
+    beta, info = solve(X, Z, LAMBDA, solver)
+    result = scores(Z if f_true is None else f_true, X @ beta)
+    result['beta'] = beta
+    result['info'] = info
+    return result
+
+#================================================================================================================
+
+# Degree path
+
+def basis_size(degree):
+    """
+    Number of monomials x^j*y^k with j+k <= degree, i.e. the (degree+1)th triangular number.
+    """
+    return (degree+1)*(degree+2)//2
+
+
+def degree_path(x, y, z, maxdegree, LAMBDA = 0.0, f_true = None, grid = False, method = 'qr', return_fit = False,
+                basis = 'monomial'):
+    """
+    Fits OLS (LAMBDA = 0) or Ridge polynomials of every degree 0,...,maxdegree to the data z in one pass.
+    In the graded ordering the basis of degree d is a column prefix of the basis of degree d+1, and the
+    leading block of a QR (or Cholesky) factorization of X is the factorization of the leading columns of X.
+    Hence X (augmented with sqrt(LAMBDA)*I for Ridge) is only factorized once, for the highest degree,
+    and each lower degree costs a triangular solve. method is either 'qr' (stable, default) or 'cholesky'
+    (faster, but only for well conditioned problems).
+
+    If grid=True, x and y are the 1D axes of a grid, and z is ordered as in regdata. Scores are computed
+    against f_true (default z). Returns a dictionary with the arrays 'degree', 'R2', 'MSE', 'bias',
+    'variance', 'extra_term', the list 'beta' of coefficient vectors (graded ordering), and the list
+    'fit' of fitted values if return_fit=True. The prefix property holds for every basis of basis_table.
+    """
+    if grid:
+        X = grid_design_matrix(x, y, maxdegree, graded=True, basis=basis)
+    else:
+        X = design_matrix(x, y, maxdegree, graded=True, basis=basis)
+    z = np.ravel(z).astype(float)
+    f_true = z if f_true is None else np.ravel(f_true)
+    N, p = X.shape
+
+    if method == 'qr':
+        if LAMBDA > 0:
+            Q, R = np.linalg.qr(np.vstack((X, np.sqrt(LAMBDA)*np.identity(p))))
+            c = Q[:N].T @ z # the augmented right-hand side is zero below row N
+            Q = Q[:N]
+        else:
+            Q, R = np.linalg.qr(X)
+            c = Q.T @ z
+    elif method == 'cholesky':
+        G = X.T @ X
+        G[np.diag_indices_from(G)] += LAMBDA
+        R = linalg.cholesky(G, lower=False)
+        c = linalg.solve_triangular(R, X.T @ z, trans='T')
+    else:
+        raise ValueError("Unknown method {}, use 'qr' or 'cholesky'".format(method))
+
+    path = {'degree': np.arange(maxdegree+1), 'beta': [], 'fit': []}
+    for key in ('R2', 'MSE', 'bias', 'variance', 'extra_term'):
+        path[key] = np.zeros(maxdegree+1)
+    fit = np.zeros(N)
+    for d in range(maxdegree+1):
+        p_prev, p_d = basis_size(d-1) if d > 0 else 0, basis_size(d)
+        beta = linalg.solve_triangular(R[:p_d,:p_d], c[:p_d])
+        if method == 'qr':
+            fit = fit + Q[:,p_prev:p_d] @ c[p_prev:p_d] # only the new columns contribute
+        else:
+            fit = X[:,:p_d] @ beta
+        for key, value in scores(f_true, fit).items():
+            path[key][d] = value
+        path['beta'].append(beta)
+        if return_fit:
+            path['fit'].append(fit)
+    return path
+
+#================================================================================================================
+
+# Ridge path
+
+def ridge_path(X, z, lambdas, f_true = None, svd = None):
+    """
+    Ridge regression of z on X for a whole vector of lambdas, based on a single thin SVD X = U diag(s) V^T
+    (which can be passed as svd = (U, s, VT) to avoid recomputing it). The coefficients are
+    beta(LAMBDA) = V diag(s/(s^2+LAMBDA)) U^T z, computed for all lambdas as one matrix product. LAMBDA = 0
+    gives the OLS (pseudo-inverse) solution.
+
+    The fitted values U diag(s^2/(s^2+LAMBDA)) U^T z are never formed: the scores on the training points
+    (against f_true, default z) are obtained from the projections U^T z, U^T f_true and U^T 1, so every
+    LAMBDA costs O(p). Returns a dictionary with 'lambda', 'beta' (one column per LAMBDA) and the score
+    arrays 'R2', 'MSE', 'bias', 'variance' and 'extra_term'.
+    """
+    lambdas = np.atleast_1d(np.asarray(lambdas, dtype=float))
+    z = np.ravel(z)
+    f_true = z if f_true is None else np.ravel(f_true)
+    U, s, VT = linalg.svd(X, full_matrices=False) if svd is None else svd
+    N = len(z)
+
+    s2 = s[:,None]**2
+    denominator = s2 + lambdas[None,:]
+    positive = denominator > 0
+    shrink = np.divide(s2, denominator, out=np.zeros_like(denominator), where=positive)
+    c = U.T @ z
+    coef = shrink*c[:,None] # coordinates of the fitted values in the basis U
+    beta = VT.T @ np.divide(s[:,None]*c[:,None], denominator, out=np.zeros_like(denominator), where=positive)
+
+    # scores from the projections, using that the columns of U are orthonormal
+    f_mean = np.mean(f_true)
+    f_var = np.mean((f_true - f_mean)**2)
+    g = U.T @ f_true
+    rss_perp = np.sum((f_true - U @ g)**2) # part of f_true outside the column space of X
+    fit_mean = (np.sum(U, axis=0) @ coef)/N
+    mse = (rss_perp + np.sum((g[:,None] - coef)**2, axis=0))/N
+    covariance = (U.T @ (f_true - f_mean)) @ coef/N # mean of (f_true - f_mean)*fit
+    path = {'lambda': lambdas, 'beta': beta,
+            'R2': 1.0 - mse/f_var,
+            'MSE': mse,
+            'bias': f_var + (f_mean - fit_mean)**2,
+            'variance': np.sum(coef**2, axis=0)/N - fit_mean**2,
+            'extra_term': -2.0*covariance}
+    return path
+
+#================================================================================================================
+
+# Scores from the normal equations
+
+def gram_scores(G, b, zz, zsum, xsum, N, beta):
+    """
+    Returns the training scores (as in "scores", with f_true = z) of the coefficients beta (one column per
+    model) using only the normal equations: G = X^TX, b = X^Tz, zz = z^Tz, zsum = sum(z), xsum = X^T1 and
+    the number of points N. This costs O(p^2) per model, independent of N.
+    """
+    beta = np.reshape(beta, (len(b), -1))
+    fit_mean = (xsum @ beta)/N
+    fit2 = np.sum(beta*(G @ beta), axis=0)/N # mean of fit^2
+    z_mean = zsum/N
+    z_var = zz/N - z_mean**2
+    mse = zz/N - 2*(b @ beta)/N + fit2
+    covariance = (b @ beta)/N - z_mean*fit_mean
+    return {'R2': 1.0 - mse/z_var,
+            'MSE': mse,
+            'bias': z_var + (z_mean - fit_mean)**2,
+            'variance': fit2 - fit_mean**2,
+            'extra_term': -2.0*covariance}
+
+#================================================================================================================
+
+# Lasso / Elastic net path
+
+def _cd_sweep(beta, q, G, b, alpha, indices):
+    """
+    One sweep of coordinate descent over the given coordinates. q = G beta is updated in place, so that
+    each coordinate costs O(p). Coordinates with G[j,j] = 0 (all-zero columns) are skipped, their coefficient
+    stays 0. Returns the largest change of a coefficient.
+    """
+    max_change = 0.0
+    for j in indices:
+        if G[j,j] == 0:
+            continue
+        old = beta[j]
+        c = b[j] - q[j] + G[j,j]*old
+        new = np.sign(c)*max(abs(c) - alpha, 0.0)/G[j,j]
+        if new != old:
+            q += G[:,j]*(new - old)
+            beta[j] = new
+            max_change = max(max_change, abs(new - old))
+    return max_change
+
+
+def _duality_gap(beta, q, G, b, zz, alpha):
+    """
+    Duality gap of 1/2|z - X beta|^2 + alpha|beta|_1, computed from G = X^TX, b = X^Tz and zz = z^Tz only.
+    The dual point is the residual, rescaled to be dual feasible.
+    """
+    rr = zz - 2*(b @ beta) + beta @ q # |r|^2
+    zr = zz - b @ beta # z^T r
+    dual_norm = np.max(np.abs(b - q)) # |X^T r|_inf
+    # without penalty (OLS) the residual itself is the dual point, and the gap -(X^T r)^T beta vanishes
+    # at the normal equations
+    s = min(1.0, alpha/dual_norm) if dual_norm > 0 and alpha > 0 else 1.0
+    primal = 0.5*rr + alpha*np.sum(np.abs(beta))
+    dual = s*zr - 0.5*s**2*rr # 1/2|z|^2 - 1/2|z - s r|^2
+    return primal - dual
+
+
+def _objective(beta, q, b, zz, alpha):
+    """
+    1/2|z - X beta|^2 + alpha|beta|_1 from b = X^Tz, zz = z^Tz and q = G beta.
+    """
+    return 0.5*(zz - 2*(b @ beta) + beta @ q) + alpha*np.sum(np.abs(beta))
+
+
+def _feature_sign(beta, q, G, b, zz, alpha, max_steps):
+    """
+    Feature-sign search (Lee et al. 2007) from beta: the Lasso restricted to the active coefficients with
+    fixed signs is the linear system G_AA beta_A = b_A - alpha*sign_A, which is solved directly, with a line
+    search over the points where coefficients cross zero (these leave the active set). When the active set is
+    optimal, the coefficient violating the optimality conditions the most joins it. On ill conditioned normal
+    equations this finishes in a few steps what coordinate descent needs thousands of sweeps for. The objective
+    never increases; beta and q = G beta are updated in place. Returns the number of steps, and whether the
+    optimality conditions hold up to the rounding errors of X^T r = b - q. For tiny LAMBDA these errors exceed
+    alpha, and the duality gap cannot tell that beta is optimal any more.
+    """
+    sign = np.sign(beta)
+    for step in range(max_steps):
+        active = np.flatnonzero(sign)
+        grad = b - q # X^T r
+        rounding = 1e-10*(np.max(np.abs(b)) + np.max(np.abs(G))*np.sum(np.abs(beta)))
+        # optimal on the active set: let the worst violator of |X^T r| <= alpha join
+        if len(active) == 0 or np.max(np.abs(grad[active] - alpha*sign[active])) <= rounding:
+            violation = np.where(sign == 0, np.abs(grad) - alpha, 0.0)
+            j = np.argmax(violation)
+            if violation[j] <= rounding:
+                return step, True
+            sign[j] = np.sign(grad[j])
+            active = np.flatnonzero(sign)
+        target = np.zeros_like(beta)
+        target[active] = np.linalg.lstsq(G[np.ix_(active, active)], b[active] - alpha*sign[active], rcond=None)[0]
+        # the objective is quadratic along the segment to target until a coefficient crosses zero, so the best
+        # point is the target or one of the crossings
+        delta = target - beta
+        crossing = active[(beta[active] != 0) & (np.sign(target[active]) != sign[active])]
+        best, best_objective = None, _objective(beta, q, b, zz, alpha)
+        for t in np.append(-beta[crossing]/delta[crossing], 1.0):
+            candidate = beta + t*delta
+            candidate[np.abs(candidate) <= 1e-15*np.max(np.abs(candidate))] = 0.0
+            candidate_q = G[:,active] @ candidate[active]
+            candidate_objective = _objective(candidate, candidate_q, b, zz, alpha)
+            if candidate_objective < best_objective:
+                best, best_objective = (candidate, candidate_q), candidate_objective
+        if best is None:
+            return step, False
+        beta[:], q[:] = best
+        sign = np.sign(beta)
+    return max_steps, False
+
+
+def lasso_path(X, z, lambdas, l2 = 0.0, tol = 1e-4, max_iter = 1000, gram = None):
+    """
+    Lasso (l2 = 0) or elastic net regression, minimizing |z - X beta|^2 + LAMBDA*|beta|_1 + l2*|beta|^2 (the
+    Lasso objective of regdata.get_beta), for every LAMBDA in lambdas. Coordinate descent works on the
+    precomputed normal equations G = X^TX and b = X^Tz (which can be passed as gram = (G, b, zz)), so a sweep
+    costs O(p^2) instead of O(n p^2). The lambdas are visited in decreasing order, each one warm started from
+    the previous solution, and the first one from the Ridge solution with the same LAMBDA (or from zero, if
+    that is better). After a full sweep only the active (nonzero) coefficients are updated until they
+    settle, and if the duality gap is still too large a feature-sign search finishes the job (see
+    _feature_sign). A LAMBDA is done when the duality gap is below tol*|z|^2/2, or when the optimality
+    conditions hold up to rounding errors (which is the only available test for tiny or zero LAMBDA).
+
+    Returns a dictionary with 'lambda', 'beta' (one column per LAMBDA, in the order of lambdas), the number of
+    sweeps and feature-sign steps 'n_iter', the final duality gaps 'gap' and 'converged', telling whether the
+    gap reached the tolerance within max_iter of them. A RuntimeWarning is issued if it did not for some LAMBDA.
+    """
+    lambdas = np.atleast_1d(np.asarray(lambdas, dtype=float))
+    if gram is None:
+        z = np.ravel(z)
+        G, b, zz = X.T @ X, X.T @ z, z @ z
+    else:
+        G, b, zz = gram
+    G = G + l2*np.identity(len(b)) # the l2 term makes it a Lasso on [X; sqrt(l2) I]
+    p = len(b)
+
+    # warm start of the largest LAMBDA: its Ridge solution, unless zero is better
+    alpha = np.max(lambdas)/2 if len(lambdas) > 0 else 0.0
+    beta = np.linalg.lstsq(G + 2*alpha*np.identity(p), b, rcond=None)[0]
+    q = G @ beta # G beta
+    if _objective(beta, q, b, zz, alpha) > 0.5*zz:
+        beta, q = np.zeros(p), np.zeros(p)
+    path = {'lambda': lambdas, 'beta': np.zeros((p, len(lambdas))),
+            'n_iter': np.zeros(len(lambdas), dtype=int), 'gap': np.zeros(len(lambdas)),
+            'converged': np.zeros(len(lambdas), dtype=bool)}
+    everything = range(p)
+    for i in np.argsort(-lambdas):
+        alpha = lambdas[i]/2 # the objective above is twice the 1/2|r|^2 + alpha|beta|_1 form
+        n_iter, optimal = 0, False
+        while n_iter < max_iter:
+            max_change = _cd_sweep(beta, q, G, b, alpha, everything)
+            n_iter += 1
+            active = np.flatnonzero(beta)
+            while max_change > tol*max(np.max(np.abs(beta)), 1e-12) and n_iter < max_iter:
+                max_change = _cd_sweep(beta, q, G, b, alpha, active)
+                n_iter += 1
+            gap = _duality_gap(beta, q, G, b, zz, alpha)
+            if gap <= tol*zz/2:
+                break
+            steps, optimal = _feature_sign(beta, q, G, b, zz, alpha, 4*p)
+            n_iter += steps
+            gap = _duality_gap(beta, q, G, b, zz, alpha)
+            if gap <= tol*zz/2 or optimal:
+                break
+        path['beta'][:,i] = beta
+        path['n_iter'][i] = n_iter
+        path['gap'][i] = gap
+        path['converged'][i] = gap <= tol*zz/2 or optimal
+    if not np.all(path['converged']):
+        failed = lambdas[~path['converged']]
+        warnings.warn("lasso_path did not converge in {} iterations for {} of {} lambdas (largest duality gap {:.3g}, "
+                      "tolerance {:.3g}); increase max_iter or use a better conditioned basis"
+                      .format(max_iter, len(failed), len(lambdas), np.max(path['gap']), tol*zz/2), RuntimeWarning)
+    return path
+
+#================================================================================================================
+
+# k-fold cross validation
+
+def fold_indices(N, k, shuffle = True, seed = None):
+    """
+    Returns a partition of the indices 0,...,N-1 into k (almost) equally sized folds, as a list of k
+    integer arrays. The indices are shuffled first unless shuffle=False, by numpy's global random state,
+    or by a generator of its own if a seed is given (so the partition can be reproduced).
+    """
+    if not shuffle:
+        indices = np.arange(N)
+    elif seed is None:
+        indices = np.random.permutation(N)
+    else:
+        indices = np.random.default_rng(seed).permutation(N)
+    return [indices[step::k] for step in range(k)]
+
+
+def kfold_cv(X, z, folds, lambdas = 0.0, lasso = False, tol = 1e-4, f_true = None):
+    """
+    k-fold cross validation of Ridge (OLS for LAMBDA = 0) or Lasso (lasso=True, with tolerance tol) regression
+    of z on X, for every LAMBDA in lambdas. folds is a list of integer index arrays (see fold_indices).
+
+    X^TX and X^Tz are only accumulated once, fold by fold, and the training system of a fold is obtained
+    by subtracting the fold's own contribution. The Ridge systems of all folds are then solved together
+    through one batched eigendecomposition of the k training matrices, which gives every LAMBDA for the
+    cost of a matrix product. Lasso runs one warm started coordinate descent path per fold on the
+    downdated normal equations.
+
+    Test scores are computed on each fold against f_true (default z), training scores from the normal
+    equations. Returns a dictionary with 'lambda', the coefficients 'beta' of shape (k, p, len(lambdas)),
+    and arrays of shape (k, len(lambdas)) named 'test_R2', 'test_MSE', 'test_bias', 'test_variance',
+    'test_extra_term' and the same with 'train_' for the training data.
+    """
+    lambdas = np.atleast_1d(np.asarray(lambdas, dtype=float))
+    z = np.ravel(z)
+    f_true = z if f_true is None else np.ravel(f_true)
+    k = len(folds); N, p = X.shape
+
+    # contribution of each fold to the normal equations
+    G_f = np.zeros((k, p, p)); b_f = np.zeros((k, p)); zz_f = np.zeros(k); zsum_f = np.zeros(k); xsum_f = np.zeros((k, p))
+    for i, fold in enumerate(folds):
+        X_i = X[fold]; z_i = z[fold]
+        G_f[i] = X_i.T @ X_i; b_f[i] = X_i.T @ z_i; zz_f[i] = z_i @ z_i
+        zsum_f[i] = np.sum(z_i); xsum_f[i] = np.sum(X_i, axis=0)
+    G = np.sum(G_f, axis=0) - G_f # training systems, one per fold
+    b = np.sum(b_f, axis=0) - b_f
+    zz = np.sum(zz_f) - zz_f; zsum = np.sum(zsum_f) - zsum_f; xsum = np.sum(xsum_f, axis=0) - xsum_f
+    n_train = N - np.array([len(fold) for fold in folds])
+
+    if lasso:
+        beta = np.stack([lasso_path(None, None, lambdas, tol=tol, gram=(G[i], b[i], zz[i]))['beta'] for i in range(k)])
+    else:
+        eigval, eigvec = np.linalg.eigh(G)
+        c = np.einsum('kji,kj->ki', eigvec, b) # eigvec^T b, per fold
+        denominator = eigval[:,:,None] + lambdas[None,None,:]
+        beta = np.einsum('kij,kjl->kil', eigvec, np.divide(c[:,:,None], denominator,
+                         out=np.zeros_like(denominator), where=denominator > 0))
+
+    cv = {'lambda': lambdas, 'beta': beta}
+    for i, fold in enumerate(folds):
+        test = scores(f_true[fold], X[fold] @ beta[i])
+        train = gram_scores(G[i], b[i], zz[i], zsum[i], xsum[i], n_train[i], beta[i])
+        for key in test:
+            cv.setdefault('test_'+key, np.zeros((k, len(lambdas))))[i] = test[key]
+            cv.setdefault('train_'+key, np.zeros((k, len(lambdas))))[i] = train[key]
+    return cv
+
+#================================================================================================================
+
+# Leave-one-out and generalized cross validation
+
+def ridge_loocv(X, z, lambdas, svd = None, blocksize = 65536):
+    """
+    Exact leave-one-out (LOOCV) and generalized cross validation (GCV) errors of Ridge regression (OLS for
+    LAMBDA = 0) for every LAMBDA in lambdas, from a single thin SVD X = U diag(s) V^T (which can be passed as
+    svd = (U, s, VT)). Ridge is a linear smoother with hat matrix H = U diag(s^2/(s^2+LAMBDA)) U^T, so the
+    leave-one-out residual of point i is r_i/(1-H_ii), and GCV replaces H_ii by trace(H)/N. No refits are
+    needed, and the rows are processed in blocks of blocksize so that memory stays O(blocksize*len(lambdas)).
+
+    Returns a dictionary with 'lambda', 'LOOCV', 'GCV' and the lambdas minimizing each ('best_LOOCV',
+    'best_GCV').
+    """
+    lambdas = np.atleast_1d(np.asarray(lambdas, dtype=float))
+    z = np.ravel(z)
+    U, s, VT = linalg.svd(X, full_matrices=False) if svd is None else svd
+    N = len(z)
+
+    s2 = s[:,None]**2
+    denominator = s2 + lambdas[None,:]
+    shrink = np.divide(s2, denominator, out=np.zeros_like(denominator), where=denominator > 0)
+    coef = shrink*(U.T @ z)[:,None]
+
+    loo = np.zeros(len(lambdas)); rss = np.zeros(len(lambdas))
+    for start in range(0, N, blocksize):
+        U_b = U[start:start+blocksize]
+        residual = z[start:start+blocksize,None] - U_b @ coef
+        leverage = (U_b**2) @ shrink # diagonal of H
+        loo += np.sum((residual/(1.0 - leverage))**2, axis=0)
+        rss += np.sum(residual**2, axis=0)
+    trace = np.sum(shrink, axis=0)
+
+    cv = {'lambda': lambdas, 'LOOCV': loo/N, 'GCV': rss/N/(1.0 - trace/N)**2}
+    cv['best_LOOCV'] = lambdas[np.argmin(cv['LOOCV'])]
+    cv['best_GCV'] = lambdas[np.argmin(cv['GCV'])]
+    return cv
+
+#================================================================================================================
+
+# Streaming bias-variance decomposition
+
+class bias_variance_accumulator:
+    """
+    Bias-variance decomposition of the predictions of many models (bootstrap replicates, folds, ...) of the
+    same target f_true, without storing the predictions. Predictions are passed to add one model, or one block
+    of models (one per column), at a time. Per point, the running mean and sum of squared deviations over the
+    models are updated with Welford's (Chan's, for blocks) formulas, so memory is O(len(f_true)).
+
+    result() returns the decomposition used in bootCV.py, MSE = bias + variance, where bias and variance are
+    taken per point over the models and averaged over the points. It also returns the decomposition of
+    Methods.py, averaged over the models: MSE = model_bias + model_variance + extra_term, where each term is
+    computed over the points of a single model (as in Methods.bias, Methods.var and Methods.extra_term).
+    """
+
+    def __init__(self, f_true):
+        self.f_true = np.ravel(f_true)
+        self.count = 0
+        self.mean = np.zeros(len(self.f_true)) # mean prediction per point
+        self.M2 = np.zeros(len(self.f_true)) # sum of squared deviations from the mean per point
+        self.model_sums = {'MSE': 0.0, 'bias': 0.0, 'variance': 0.0, 'extra_term': 0.0}
+
+    def add(self, predictions):
+        P = np.reshape(predictions, (len(self.f_true), -1))
+        B = P.shape[1]
+        block_mean = np.mean(P, axis=1)
+        block_M2 = np.sum((P - block_mean[:,None])**2, axis=1)
+        delta = block_mean - self.mean
+        total = self.count + B
+        self.mean += delta*B/total
+        self.M2 += block_M2 + delta**2*self.count*B/total
+        self.count = total
+        for key, value in scores(self.f_true, P).items():
+            if key in self.model_sums:
+                self.model_sums[key] += np.sum(value)
+
+    def result(self):
+        variance = self.M2/self.count
+        bias = (self.f_true - self.mean)**2
+        return {'MSE': np.mean(bias + variance), 'bias': np.mean(bias), 'variance': np.mean(variance),
+                'model_bias': self.model_sums['bias']/self.count,
+                'model_variance': self.model_sums['variance']/self.count,
+                'extra_term': self.model_sums['extra_term']/self.count}
+
+#================================================================================================================
+
+# Bootstrap
+
+def bootstrap(X, z, n_bootstraps, X_test, z_test, LAMBDA = 0.0, samplesize = None, blocksize = 256):
+    """
+    Bootstrap of Ridge regression (OLS for LAMBDA = 0) of z on X, evaluated on the test data (X_test, z_test).
+    A resample is represented by its multinomial count vector w (how many times each point was drawn), so its
+    fit solves the weighted normal equations X^T diag(w) X beta = X^T diag(w) z and no resampled design
+    matrix is materialized. The replicates are drawn and solved in blocks of at most blocksize, as one stacked
+    batch per block, and the test statistics are accumulated on the fly (see bias_variance_accumulator). Peak memory is therefore independent
+    of n_bootstraps.
+
+    To keep the normal equations well conditioned for high degrees, X is orthogonalized once, X = Q R, and the
+    weighted systems are solved in the Q basis, where Q^T diag(w) Q is close to the identity.
+
+    Returns the dictionary of bias_variance_accumulator.result() for the test data, with the mean coefficient
+    vector 'beta_mean' added.
+    """
+    z = np.ravel(z).astype(float); z_test = np.ravel(z_test)
+    N, p = X.shape
+    samplesize = N if samplesize is None else samplesize
+
+    Q, R = np.linalg.qr(X)
+    R_inv = linalg.solve_triangular(R, np.identity(p))
+    Q_test = X_test @ R_inv
+    penalty = LAMBDA*(R_inv.T @ R_inv) # LAMBDA*|beta|^2 in terms of gamma = R beta
+
+    blocksize = max(1, min(blocksize, 2**22//(N*p))) # bounds the (blocksize, p, N) work array
+    accumulator = bias_variance_accumulator(z_test); sum_gamma = np.zeros(p)
+    for start in range(0, n_bootstraps, blocksize):
+        B = min(blocksize, n_bootstraps - start)
+        w = np.random.multinomial(samplesize, np.full(N, 1.0/N), size=B).astype(float)
+        QW = Q.T[None,:,:]*w[:,None,:]
+        gamma = np.linalg.solve(QW @ Q + penalty, (QW @ z)[:,:,None])[:,:,0]
+        accumulator.add(Q_test @ gamma.T) # one column per replicate
+        sum_gamma += np.sum(gamma, axis=0)
+
+    result = accumulator.result()
+    result['beta_mean'] = R_inv @ (sum_gamma/n_bootstraps)
+    return result
+
+#================================================================================================================
+
+# Out-of-core least squares for large rasters
+
+def load_raster(filename, cache = None):
+    """
+    Returns the raster (e.g. SRTM terrain data) in filename as a read-only memory map, so that it is read
+    from disk tile by tile when it is used. A .npy file is mapped directly. A TIFF file is mapped with tifffile
+    when it is installed and the file is uncompressed; otherwise it is read with imageio. The decoded raster is
+    then stored as a .npy file in the directory cache (None for RESULT_CACHE_DIR, under the name of the file
+    and a hash of its path, size and modification time) and mapped from there, or, if there is no cache
+    directory, returned as an array in memory. Nothing is written next to filename.
+    """
+    root, ext = os.path.splitext(filename)
+    if ext == '.npy':
+        return np.load(filename, mmap_mode='r')
+    try:
+        import tifffile
+        return tifffile.memmap(filename, mode='r')
+    except (ImportError, ValueError):
+        from imageio import imread
+        directory = RESULT_CACHE_DIR if cache is None else cache
+        if not directory:
+            return np.asarray(imread(filename))
+        stat = os.stat(filename)
+        key = repr((os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)).encode()
+        path = os.path.join(directory, '{}-{}.npy'.format(os.path.basename(root), hashlib.sha1(key).hexdigest()[:16]))
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            np.save(path, np.asarray(imread(filename)))
+        return np.load(path, mmap_mode='r')
+
+
+def raster_tiles(shape, tilesize):
+    """
+    Returns the list of (rows, columns) slices that cut a raster of the given shape into tiles of at most
+    tilesize x tilesize pixels.
+    """
+    return [(slice(i, min(i+tilesize, shape[0])), slice(j, min(j+tilesize, shape[1])))
+            for i in range(0, shape[0], tilesize) for j in range(0, shape[1], tilesize)]
+
+
+def _tile_system(raster, tile, degree, method, basis):
+    """
+    Design matrix and data of one tile (pixel (row, column) is the point (x, y) = (column, row) scaled to
+    [0,1], as in regdata), reduced to its normal equations or, for method='tsqr', to the R factor of [X z].
+    """
+    rows, columns = tile
+    x = np.linspace(0, 1, raster.shape[1])[columns]; y = np.linspace(0, 1, raster.shape[0])[rows]
+    X = grid_design_matrix(x, y, degree, graded=True, cache=False, basis=basis)
+    z = np.ravel(np.asarray(raster[rows, columns], dtype=float), order='F')
+    if method == 'tsqr':
+        return np.linalg.qr(np.column_stack((X, z)), mode='r'), np.sum(z), len(z)
+    return (X.T @ X, X.T @ z, z @ z), np.sum(z), len(z)
+
+
+def chunked_lstsq(raster, degree, tilesize = 512, method = 'normal', n_jobs = 1, basis = 'monomial'):
+    """
+    Least square fit of a polynomial of the given degree to a whole raster (for instance a memory map from
+    load_raster), processed tile by tile so that only one tile's design matrix per worker is in memory.
+
+    With method='normal', X^TX, X^Tz and z^Tz are accumulated over the tiles and the normal equations are
+    solved at the end. With method='tsqr' (tall-skinny QR), each tile is reduced to the R factor of its
+    [X z], and the stacked factors are reduced by one more QR. This avoids squaring the condition number of X.
+    The tiles are independent; with n_jobs > 1 they are processed by a pool of threads (NumPy releases the
+    GIL in the linear algebra, and the memory map is shared without copies).
+
+    For high degrees, basis='legendre' or 'chebyshev' keeps the normal equations well conditioned.
+    Returns a dictionary with the coefficients 'beta' (graded ordering, see polynomial_powers), the 'MSE' and
+    'R2' of the fit and the number of points 'N'.
+    """
+    if method not in ('normal', 'tsqr'):
+        raise ValueError("Unknown method {}, use 'normal' or 'tsqr'".format(method))
+    tiles = raster_tiles(raster.shape, tilesize)
+    work = lambda tile: _tile_system(raster, tile, degree, method, basis)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(n_jobs) as pool:
+            systems = list(pool.map(work, tiles))
+    else:
+        systems = [work(tile) for tile in tiles]
+    zsum = sum(system[1] for system in systems); N = sum(system[2] for system in systems)
+    p = basis_size(degree)
+
+    if method == 'tsqr':
+        R = np.linalg.qr(np.vstack([system[0] for system in systems]), mode='r')
+        beta = linalg.solve_triangular(R[:p,:p], R[:p,p])
+        rss = R[p,p]**2
+        zz = np.sum(R[:,p]**2) # |Q^T z|^2 = |z|^2
+    else:
+        G = sum(system[0][0] for system in systems)
+        b = sum(system[0][1] for system in systems)
+        zz = sum(system[0][2] for system in systems)
+        beta = linalg.solve(G, b, assume_a='pos')
+        rss = zz - 2*(b @ beta) + beta @ (G @ beta)
+    return {'beta': beta, 'MSE': rss/N, 'R2': 1.0 - rss/(zz - zsum**2/N), 'N': N}
+
+#================================================================================================================
+
+# Parallel (degree, LAMBDA, fold, method) grid studies
+
+GRID_METHODS = ('ols', 'ridge', 'lasso')
+GRID_SCORES = ('test_R2', 'test_MSE', 'test_bias', 'test_variance', 'test_extra_term',
+               'train_R2', 'train_MSE', 'train_bias', 'train_variance', 'train_extra_term')
+_grid_arrays = {} # X, z, f_true and the folds of the running study, in every worker process
+_grid_blocks = [] # the shared memory blocks behind _grid_arrays, kept open while the worker lives
+
+def _grid_attach(specs, folds):
+    """
+    Initializer of the grid_study workers: maps the shared memory blocks described by specs
+    (name -> (block name, shape, dtype)) as arrays, without copying them.
+    """
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _grid_blocks.append(block)
+        _grid_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    _grid_arrays['folds'] = folds
+
+
+def _grid_task(degree, method, lambdas, tol):
+    """
+    All folds and lambdas of one (degree, method) pair of grid_study, by kfold_cv on the leading columns of
+    the shared design matrix.
+    """
+    X = _grid_arrays['X'][:,:basis_size(degree)]
+    lambdas = np.zeros(1) if method == 'ols' else lambdas
+    cv = kfold_cv(X, _grid_arrays['z'], _grid_arrays['folds'], lambdas, lasso=(method == 'lasso'), tol=tol,
+                  f_true=_grid_arrays['f_true'])
+    return degree, method, cv['lambda'], {key: cv[key] for key in GRID_SCORES}
+
+
+def grid_study(x, y, z, degrees, lambdas, folds, methods = GRID_METHODS, f_true = None, grid = False,
+               basis = 'monomial', tol = 1e-4, n_jobs = 1, verbose = False):
+    """
+    k-fold cross validation of every (degree, LAMBDA, fold, method) cell, methods from GRID_METHODS, spread
+    over a pool of n_jobs processes (None: all cores). The default n_jobs = 1 runs in this process, so
+    that importing or running a script never starts a pool implicitly; a script passing n_jobs > 1 has to
+    keep its driver code under if __name__ == '__main__', since the workers import the main module under
+    the spawn and forkserver start methods. x, y, z and f_true are as in degree_path, folds as in kfold_cv.
+
+    The design matrix of the largest degree is built once, in graded ordering, and placed in shared memory
+    together with z and f_true, so the workers read it instead of receiving pickled copies. The design
+    matrix of a lower degree is a block of its leading columns (see degree_path). A task is one
+    (degree, method) pair, which gets all folds from one set of normal equations and all lambdas as one
+    batch (see kfold_cv); the largest degrees are submitted first.
+
+    Returns a structured array with one row per cell and the fields 'degree', 'lambda' (0 for OLS), 'fold',
+    'method' and the scores in GRID_SCORES. The rows are filled as the tasks complete; see grid_mean for
+    averaging over the folds.
+    """
+    degrees = np.atleast_1d(degrees).astype(int)
+    lambdas = np.atleast_1d(np.asarray(lambdas, dtype=float))
+    for method in methods:
+        if method not in GRID_METHODS:
+            raise ValueError("Unknown method {}, use one of {}".format(method, GRID_METHODS))
+    z = np.ravel(z).astype(float)
+    f_true = z if f_true is None else np.ravel(f_true).astype(float)
+    build = grid_design_matrix if grid else design_matrix
+    arrays = {'X': np.ascontiguousarray(build(x, y, np.max(degrees), graded=True, cache=False, basis=basis)),
+              'z': z, 'f_true': f_true}
+
+    k = len(folds)
+    tasks = [(degree, method) for degree in sorted(degrees, reverse=True) for method in methods]
+    size = sum(k*(1 if method == 'ols' else len(lambdas)) for degree, method in tasks)
+    dtype = [('degree', int), ('lambda', float), ('fold', int), ('method', 'U5')] + [(key, float) for key in GRID_SCORES]
+    study = np.zeros(size, dtype=dtype)
+    filled = 0
+    def store(degree, method, cell_lambdas, cv):
+        nonlocal filled
+        L = len(cell_lambdas); rows = slice(filled, filled + k*L)
+        study['degree'][rows] = degree; study['method'][rows] = method
+        study['fold'][rows] = np.repeat(np.arange(k), L); study['lambda'][rows] = np.tile(cell_lambdas, k)
+        for key in GRID_SCORES:
+            study[key][rows] = np.ravel(cv[key])
+        filled += k*L
+        if verbose:
+            print("Completed degree {}, {} ({}/{} cells)".format(degree, method, filled, size))
+
+    n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+    if n_jobs == 1:
+        _grid_arrays.update(arrays); _grid_arrays['folds'] = folds
+        try:
+            for degree, method in tasks:
+                store(*_grid_task(degree, method, lambdas, tol))
+        finally:
+            _grid_arrays.clear()
+        return study
+
+    blocks = []
+    try:
+        specs = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            specs[name] = (block.name, array.shape, array.dtype)
+        with ProcessPoolExecutor(min(n_jobs, len(tasks)), initializer=_grid_attach, initargs=(specs, folds)) as pool:
+            futures = [pool.submit(_grid_task, degree, method, lambdas, tol) for degree, method in tasks]
+            for future in as_completed(futures):
+                store(*future.result())
+    finally:
+        for block in blocks:
+            block.close(); block.unlink()
+    return study
+
+
+def grid_mean(study, score, method, by = 'degree', degree = None, LAMBDA = None):
+    """
+    Averages the score of the given method over the folds of a grid_study, as a function of 'degree' or
+    'lambda' (by), keeping only the cells with the given degree and/or LAMBDA. Returns the sorted values of
+    by and the mean scores.
+    """
+    cells = study[study['method'] == method]
+    if degree is not None:
+        cells = cells[cells['degree'] == degree]
+    if LAMBDA is not None and method != 'ols':
+        cells = cells[np.isclose(cells['lambda'], LAMBDA)]
+    values, inverse = np.unique(cells[by], return_inverse=True)
+    return values, np.bincount(inverse, weights=cells[score])/np.bincount(inverse)
+
+#================================================================================================================
+
+# On-disk result cache
+
+RESULT_CACHE_DIR = os.environ.get('REGRESSION_CACHE_DIR') # directory of the shared cache of cached_result, off if None
+RESULT_CACHE_SIZE = 2**30 # bytes kept on disk before the least recently used results are removed
+CACHE_VERSION = 1 # part of every result key; increase it when a change to this module changes results
+
+def _hash_value(h, value):
+    numeric = (np.number, int, float)
+    if isinstance(value, (list, tuple)) and all(isinstance(v, numeric) and not isinstance(v, bool) for v in value):
+        value = np.asarray(value, dtype=float) # hashed like the equal array
+    if isinstance(value, (list, tuple)):
+        h.update(b'[')
+        for item in value:
+            _hash_value(h, item)
+        h.update(b']')
+    elif isinstance(value, (np.ndarray,) + numeric) and not isinstance(value, bool):
+        a = np.ascontiguousarray(value, dtype=float)
+        h.update(repr(a.shape).encode()); h.update(a.tobytes())
+    else:
+        h.update(repr(value).encode())
+
+
+def result_key(**params):
+    """
+    Returns the content address (a sha1 hex digest) of a result computed from params. Arrays, numbers and
+    lists of them (e.g. the surface f, lambdas or a fold partition) are hashed by their values, so 5 and 5.0
+    give the same key, everything else by its repr. CACHE_VERSION is hashed too, so results stored by an
+    older version of the code are not found any more.
+    """
+    h = hashlib.sha1()
+    h.update('version={};'.format(CACHE_VERSION).encode())
+    for name in sorted(params):
+        h.update(name.encode() + b'=')
+        _hash_value(h, params[name])
+    return h.hexdigest()
+
+
+class result_cache:
+    """
+    Content-addressed cache of results on disk, in directory (default RESULT_CACHE_DIR, or ~/.cache/regression
+    if that is not set), keyed by result_key.
+    A result is an array or a dictionary of arrays, numbers, lists of arrays (e.g. the 'beta' of degree_path)
+    and small JSON values (e.g. solver info). Every entry is a directory of .npy files, one per array, which
+    get maps into memory read-only instead of reading them. When the entries take more than maxsize bytes
+    (default RESULT_CACHE_SIZE), the least recently used ones are removed; get marks an entry as used.
+    """
+
+    def __init__(self, directory = None, maxsize = None):
+        if directory is None:
+            directory = RESULT_CACHE_DIR or os.path.join(os.path.expanduser('~'), '.cache', 'regression')
+        self.directory = directory
+        self.maxsize = RESULT_CACHE_SIZE if maxsize is None else maxsize
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Returns the result stored under key, or None if there is none."""
+        path = self.path(key)
+        try:
+            with open(os.path.join(path, 'meta.json')) as meta_file:
+                meta = json.load(meta_file)
+            load = lambda name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+            if meta['array']:
+                result = load('array')
+            else:
+                result = dict(meta['values'])
+                for name in meta['arrays']:
+                    a = load(name)
+                    result[name] = a[()] if a.ndim == 0 else a
+                for name, length in meta['lists'].items():
+                    result[name] = [load('{}.{}'.format(name, i)) for i in range(length)]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return result
+
+    def put(self, key, result):
+        """Stores result under key, then evicts old entries if the cache is too large."""
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.path('{}.{}.tmp'.format(key, os.getpid()))
+        os.makedirs(temporary, exist_ok=True)
+        save = lambda name, value: np.save(os.path.join(temporary, name + '.npy'), np.asarray(value))
+        meta = {'array': isinstance(result, np.ndarray), 'arrays': [], 'lists': {}, 'values': {}}
+        if meta['array']:
+            save('array', result)
+        else:
+            for name, value in result.items():
+                if isinstance(value, (np.ndarray, np.number, int, float)) and not isinstance(value, bool):
+                    save(name, value); meta['arrays'].append(name)
+                elif isinstance(value, list):
+                    for i, item in enumerate(value):
+                        save('{}.{}'.format(name, i), item)
+                    meta['lists'][name] = len(value)
+                else:
+                    meta['values'][name] = value
+        with open(os.path.join(temporary, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file, default=lambda v: v.item() if hasattr(v, 'item') else str(v))
+        try:
+            os.rename(temporary, self.path(key))
+        except OSError: # stored by another process in the meantime
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.evict(keep=key)
+
+    def evict(self, keep = None):
+        """Removes the least recently used entries (except keep) until the cache fits in maxsize bytes."""
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self.path(key)
+            if key.endswith('.tmp') or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((os.path.getmtime(path), size, key))
+        total = sum(entry[1] for entry in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.maxsize:
+                break
+            if key != keep:
+                shutil.rmtree(self.path(key), ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        """Removes every entry of the cache."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_result_cache = None
+
+def cached_result(compute, cache = None, **params):
+    """
+    Returns compute() through the on-disk result cache, keyed by params (see result_key): the stored result
+    is returned if there is one, otherwise compute() is called and stored. cache is a result_cache, False to
+    always compute, or None for the shared one in RESULT_CACHE_DIR. The shared cache is opt-in: it is only
+    used if RESULT_CACHE_DIR is set (by the environment variable REGRESSION_CACHE_DIR), otherwise None
+    computes as well, so plain runs of the scripts write nothing to disk.
+    """
+    global _result_cache
+    if cache is False or (cache is None and RESULT_CACHE_DIR is None):
+        return compute()
+    if cache is None:
+        if _result_cache is None or _result_cache.directory != RESULT_CACHE_DIR:
+            _result_cache = result_cache(RESULT_CACHE_DIR)
+        cache = _result_cache
+    key = result_key(**params)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.put(key, result)
+    return result
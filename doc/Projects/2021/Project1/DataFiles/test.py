@@ -1,24 +1,24 @@
+import os
+import sys
+sys.path.append('../../../../Programs/VariousCodes')
+from regression import load_raster, chunked_lstsq
+
 import numpy as np
-from imageio import imread
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib import cm
 import numpy as np
 from numpy.random import normal, uniform
 
-# Load the terrain
-terrain = imread('SRTM_data_Norway_1.tif')
+# Load the terrain as a memory map, it is read from disk tile by tile
+terrain = load_raster('SRTM_data_Norway_1.tif')
 
-N = 1000
 m = 5 # polynomial order
-terrain = terrain[:N,:N]
-# Creates mesh of image pixels
-x = np.linspace(0,1, np.shape(terrain)[0])
-y = np.linspace(0,1, np.shape(terrain)[1])
-x_mesh, y_mesh = np.meshgrid(x,y)
-
-z = terrain
-X = create_X(x_mesh, y_mesh,m)
+# Fit the full raster in bounded memory. The pixels are mapped to the unit square,
+# x along the columns and y along the rows. Use method='tsqr' for high orders.
+fit = chunked_lstsq(terrain, m, tilesize=512, method='normal', n_jobs=os.cpu_count())
+print("MSE: %.5f" % fit['MSE'])
+print("R2_Score: %.5f" % fit['R2'])
 
 
 # Show the terrain
@@ -0,0 +1,189 @@
+# Gradient boosted trees on the histogram engine of cart.py. Every tree is fitted to the gradients
+# and Hessians of the loss at the current predictions: the histograms of a node sum them per bin,
+# the split gain and the leaf values are the second order ones, with L1 (reg_alpha) and L2
+# (reg_lambda) regularization of the leaf values. The features are binned once per data set, and
+# the binning can be passed to fit to reuse it for every model of a sweep
+import numpy as np
+from cart import bin_features, histogram, add_node, FlatTree
+
+# Gradients and Hessians of the squared error (y - F)^2/2 with respect to the prediction F
+def squared_error(y, F):
+	return F - y, np.ones(len(F))
+
+# Gradients and Hessians of the logistic loss of labels y in {0,1} with respect to the log-odds F
+def logistic(y, F):
+	p = 1.0/(1.0 + np.exp(-F))
+	return p - y, p*(1.0 - p)
+
+# The losses by name, with the constant prediction every model starts from
+LOSSES = {
+	'squared_error': (squared_error, lambda y: np.mean(y)),
+	'logistic': (logistic, lambda y: np.log(np.mean(y)/(1.0 - np.mean(y)))),
+}
+
+# Soft thresholding of gradient sums G by the L1 penalty alpha
+def soft_threshold(G, alpha):
+	return np.sign(G)*np.maximum(np.abs(G) - alpha, 0.0)
+
+# Value of a leaf with gradient sum G and Hessian sum H (0 if H + reg_lambda vanishes, as for a pure
+# leaf of the logistic loss without L2 penalty), and its reduction of the regularized loss
+def leaf_value(G, H, reg_lambda, reg_alpha):
+	if not H + reg_lambda > 0:
+		return 0.0
+	return -soft_threshold(G, reg_alpha)/(H + reg_lambda)
+
+def leaf_score(G, H, reg_lambda, reg_alpha):
+	return soft_threshold(G, reg_alpha)**2/(H + reg_lambda)
+
+# Find the best split from the gradient histograms of a node, hist[f, b] = (sum of gradients, sum of
+# Hessians, number of rows) over the rows in bin b of feature f, for all features and bins at once:
+# bins < b go left. Both children need a Hessian sum of at least min_child_weight, and only the
+# features with allowed[f] are tried. Returns the feature, the bin b and the gain, or feature -1 if
+# no split gains more than gamma
+def gain_split(hist, reg_lambda, reg_alpha, min_child_weight, gamma, allowed):
+	left = np.cumsum(hist, axis=1)[:,:-1]
+	total = np.sum(hist[0], axis=0)
+	right = total - left
+	with np.errstate(divide='ignore', invalid='ignore'):
+		gain = 0.5*(leaf_score(left[:,:,0], left[:,:,1], reg_lambda, reg_alpha)
+			+ leaf_score(right[:,:,0], right[:,:,1], reg_lambda, reg_alpha)
+			- leaf_score(total[0], total[1], reg_lambda, reg_alpha)) - gamma
+	small = (left[:,:,2] == 0) | (right[:,:,2] == 0) | (left[:,:,1] < min_child_weight) | (right[:,:,1] < min_child_weight)
+	gain[small | ~allowed[:,np.newaxis]] = -np.inf
+	index, b = np.unravel_index(np.argmax(gain), gain.shape)
+	if not gain[index,b] > 0:
+		return -1, 0, 0.0
+	return index, b+1, gain[index,b]
+
+# Grow a boosting tree on the binned features B, adding its nodes to nodes with the bin b of their
+# split as threshold. w holds the gradient, Hessian and 1 of every row, hist the histograms of rows.
+# As in grow_hist, only the smaller child's histograms are counted. Leaf values are shrunk by
+# learning_rate, and the gain of every split is added to gains[feature]
+def grow_boost(B, w, rows, hist, depth, nodes, gains, allowed, params):
+	G, H = np.sum(hist[0,:,0]), np.sum(hist[0,:,1])
+	node = add_node(nodes, params['learning_rate']*leaf_value(G, H, params['reg_lambda'], params['reg_alpha']))
+	if depth > params['max_depth']:
+		return node
+	index, b, gain = gain_split(hist, params['reg_lambda'], params['reg_alpha'], params['min_child_weight'], params['gamma'], allowed)
+	if index < 0:
+		return node
+	nodes['feature'][node], nodes['threshold'][node] = index, b
+	gains[index] += gain
+	go_left = B[rows,index] < b
+	children = (rows[go_left], rows[~go_left])
+	small = 0 if len(children[0]) <= len(children[1]) else 1
+	hists = [None, None]
+	hists[small] = histogram(B, children[small], w, hist.shape[1])
+	hists[1-small] = hist - hists[small]
+	for name, child, child_hist in zip(('left', 'right'), children, hists):
+		nodes[name][node] = grow_boost(B, w, child, child_hist, depth+1, nodes, gains, allowed, params)
+	return node
+
+# Stack the nodes of several FlatTrees into one FlatTree, returning it and the node number of
+# every tree's root in it
+def stack_trees(trees):
+	sizes = [len(tree.value) for tree in trees]
+	roots = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.intp)
+	shift = lambda child, root: np.where(child >= 0, child + root, -1)
+	stacked = FlatTree(np.concatenate([tree.feature for tree in trees]), np.concatenate([tree.threshold for tree in trees]),
+		np.concatenate([shift(tree.left, root) for tree, root in zip(trees, roots)]),
+		np.concatenate([shift(tree.right, root) for tree, root in zip(trees, roots)]),
+		np.concatenate([tree.value for tree in trees]))
+	return stacked, roots
+
+# Leaf reached by every row of X in every tree of a stacked ensemble: all rows move down one level
+# in all trees at once, so there is one vectorized step per level of the deepest tree
+def apply_stacked(stacked, roots, X):
+	X = np.asarray(X, dtype=float)
+	node = np.tile(roots, (len(X), 1))
+	row = np.repeat(np.arange(len(X)), len(roots)).reshape(node.shape)
+	active = np.flatnonzero(stacked.feature[node] >= 0)
+	node, row = node.ravel(), row.ravel()
+	while len(active) > 0:
+		at = node[active]
+		go_left = X[row[active],stacked.feature[at]] < stacked.threshold[at]
+		node[active] = np.where(go_left, stacked.left[at], stacked.right[at])
+		active = active[stacked.feature[node[active]] >= 0]
+	return node.reshape(len(X), len(roots))
+
+# A gradient boosting model for the losses in LOSSES ('squared_error' for regression, 'logistic' for
+# two classes). Every tree is fitted to a random fraction subsample of the rows and may split on a
+# random fraction colsample of the features, drawn with the seed. After fit, importance holds the
+# total split gain of every feature
+class GradientBoosting(object):
+
+	def __init__(self, loss = 'squared_error', n_trees = 100, learning_rate = 0.1, max_depth = 3, reg_lambda = 1.0,
+			reg_alpha = 0.0, gamma = 0.0, min_child_weight = 1.0, subsample = 1.0, colsample = 1.0, max_bins = 256, seed = None):
+		if loss not in LOSSES:
+			raise ValueError("Unknown loss %s, use one of %s" % (loss, ', '.join(sorted(LOSSES))))
+		self.loss, self.n_trees, self.learning_rate, self.max_depth = loss, n_trees, learning_rate, max_depth
+		self.reg_lambda, self.reg_alpha, self.gamma, self.min_child_weight = reg_lambda, reg_alpha, gamma, min_child_weight
+		self.subsample, self.colsample, self.max_bins, self.seed = subsample, colsample, max_bins, seed
+
+	# Fit the trees to the rows of X and their targets y (labels if the loss is 'logistic'). bins is
+	# the binning bin_features(X) of X, computed here if not given
+	def fit(self, X, y, bins = None):
+		B, edges = bin_features(X, self.max_bins) if bins is None else bins
+		y = np.ravel(y)
+		if self.loss == 'logistic':
+			self.classes, y = np.unique(y, return_inverse=True)
+			if len(self.classes) != 2:
+				raise ValueError('The logistic loss needs two classes, got %d' % len(self.classes))
+		gradients, initial = LOSSES[self.loss]
+		n, d = B.shape
+		n_bins = max(len(e) for e in edges) + 1
+		params = dict((name, getattr(self, name)) for name in ('learning_rate', 'max_depth', 'reg_lambda', 'reg_alpha', 'min_child_weight', 'gamma'))
+		rng = np.random.default_rng(self.seed)
+		self.base = initial(y)
+		F = np.full(n, self.base)
+		w = np.ones((n, 3))
+		self.importance = np.zeros(d)
+		self.trees = list()
+		for t in range(self.n_trees):
+			w[:,0], w[:,1] = gradients(y, F)
+			rows = np.arange(n) if self.subsample >= 1 else np.sort(rng.choice(n, max(1, int(self.subsample*n)), replace=False))
+			allowed = np.ones(d, dtype=bool)
+			if self.colsample < 1:
+				allowed[:] = False
+				allowed[rng.choice(d, max(1, int(self.colsample*d)), replace=False)] = True
+			nodes = dict((name, []) for name in FlatTree.__slots__)
+			grow_boost(B, w, rows, histogram(B, rows, w, n_bins), 1, nodes, self.importance, allowed, params)
+			tree = FlatTree(**nodes)
+			# the thresholds are bins while growing, so the tree applies to B as it is
+			F += tree.predict(B)
+			tree.threshold = np.array([edges[f][int(b)-1] if f >= 0 else 0.0 for f, b in zip(tree.feature, tree.threshold)])
+			self.trees.append(tree)
+		self.stacked, self.roots = stack_trees(self.trees)
+		return self
+
+	# Prediction of every tree for every row of X, one column per tree (the first n_trees trees only,
+	# if given). The model's prediction is their sum plus the starting prediction self.base
+	def tree_predictions(self, X, n_trees = None):
+		roots = self.roots if n_trees is None else self.roots[:n_trees]
+		return self.stacked.value[apply_stacked(self.stacked, roots, X)]
+
+	# Sum of the predictions of all trees (or of the first n_trees) and the starting prediction, that
+	# is the log-odds of the second class for the logistic loss
+	def decision_function(self, X, n_trees = None):
+		return self.base + np.sum(self.tree_predictions(X, n_trees), axis=1)
+
+	# Predictions after every number of trees 1,...,n_trees for every row of X, one column per number
+	def staged_decision_function(self, X):
+		return self.base + np.cumsum(self.tree_predictions(X), axis=1)
+
+	# Probabilities of the two classes for every row of X (logistic loss)
+	def predict_proba(self, X):
+		p = 1.0/(1.0 + np.exp(-self.decision_function(X)))
+		return np.column_stack((1.0 - p, p))
+
+	# Regression predictions, or predicted labels for the logistic loss
+	def predict(self, X):
+		F = self.decision_function(X)
+		return self.classes[(F > 0).astype(np.intp)] if self.loss == 'logistic' else F
+
+	# Accuracy for the logistic loss, R2 score for the squared error
+	def score(self, X, y):
+		y = np.ravel(y)
+		if self.loss == 'logistic':
+			return np.mean(self.predict(X) == y)
+		return 1.0 - np.sum((y - self.predict(X))**2)/np.sum((y - np.mean(y))**2)
@@ -1,7 +1,8 @@
 # CART on the Bank Note dataset
-from random import seed
-from random import randrange
+import os
+from concurrent.futures import ProcessPoolExecutor
 from csv import reader
+import numpy as np
  
 # Load a CSV file
 def load_csv(filename):
@@ -15,45 +16,46 @@ def str_column_to_float(dataset, column):
 	for row in dataset:
 		row[column] = float(row[column].strip())
  
-# Split a dataset into k folds
-def cross_validation_split(dataset, n_folds):
-	dataset_split = list()
-	dataset_copy = list(dataset)
-	fold_size = int(len(dataset) / n_folds)
-	for i in range(n_folds):
-		fold = list()
-		while len(fold) < fold_size:
-			index = randrange(len(dataset_copy))
-			fold.append(dataset_copy.pop(index))
-		dataset_split.append(fold)
-	return dataset_split
+# Split the row numbers 0,...,n-1 into k folds, the rows of fold i being folds[i]. The folds are
+# consecutive pieces of one random permutation drawn with seed, and the n % n_folds rows left over
+# are in no fold
+def cross_validation_split(n, n_folds, seed = None):
+	fold_size = n // n_folds
+	return np.random.default_rng(seed).permutation(n)[:n_folds*fold_size].reshape(n_folds, fold_size)
  
 # Calculate accuracy percentage
 def accuracy_metric(actual, predicted):
-	correct = 0
-	for i in range(len(actual)):
-		if actual[i] == predicted[i]:
-			correct += 1
-	return correct / float(len(actual)) * 100.0
+	return float(np.mean(np.asarray(actual) == np.asarray(predicted))) * 100.0
+
+_cv_data = dict() # X and y of the running evaluate_algorithm, in every worker process
+
+# Initializer of the evaluate_algorithm workers, which receive X and y once instead of once per fold
+def _cv_attach(X, y):
+	_cv_data['X'], _cv_data['y'] = X, y
+
+# Train the algorithm on all rows but the test rows of one fold, and score its predictions for them
+def _cv_fold(algorithm, test, args):
+	X, y = _cv_data['X'], _cv_data['y']
+	train = np.ones(len(y), dtype=bool)
+	train[test] = False
+	return accuracy_metric(y[test], algorithm(X[train], y[train], X[test], *args))
  
-# Evaluate an algorithm using a cross validation split
-def evaluate_algorithm(dataset, algorithm, n_folds, *args):
-	folds = cross_validation_split(dataset, n_folds)
-	scores = list()
-	for fold in folds:
-		train_set = list(folds)
-		train_set.remove(fold)
-		train_set = sum(train_set, [])
-		test_set = list()
-		for row in fold:
-			row_copy = list(row)
-			test_set.append(row_copy)
-			row_copy[-1] = None
-		predicted = algorithm(train_set, test_set, *args)
-		actual = [row[-1] for row in fold]
-		accuracy = accuracy_metric(actual, predicted)
-		scores.append(accuracy)
-	return scores
+# Evaluate an algorithm using a cross validation split of the rows of the feature matrix X and their
+# labels y. algorithm(X_train, y_train, X_test, *args) returns the predicted labels of X_test. The folds
+# are drawn with seed and trained in n_jobs processes (by default 1, no pool; all CPUs if None, which
+# needs the calling script's driver code under if __name__ == '__main__'). The scores are in fold order
+def evaluate_algorithm(X, y, algorithm, n_folds, *args, seed = None, n_jobs = 1):
+	X, y = np.asarray(X, dtype=float), np.asarray(y)
+	folds = cross_validation_split(len(y), n_folds, seed)
+	n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+	if n_jobs == 1:
+		_cv_attach(X, y)
+		try:
+			return [_cv_fold(algorithm, test, args) for test in folds]
+		finally:
+			_cv_data.clear()
+	with ProcessPoolExecutor(min(n_jobs, n_folds), initializer=_cv_attach, initargs=(X, y)) as pool:
+		return list(pool.map(_cv_fold, [algorithm]*n_folds, folds, [args]*n_folds))
  
 # Split a dataset based on an attribute and an attribute value
 def test_split(index, value, dataset):
@@ -85,17 +87,103 @@ def gini_index(groups, classes):
 		gini += (1.0 - score) * (size / n_instances)
 	return gini
  
+# Sort the rows by every feature once, orders[index] lists the row numbers sorted by feature index
+def presort(X):
+	return np.argsort(X, axis=0, kind='stable').T
+
+# The split that the exhaustive search of the list-based CART finds among the candidates, given as
+# (feature index, its rows in sorted order, their values, scores): it tries the features in order, and
+# the value of every row in row order as threshold, keeping the first one with the lowest score. Splits
+# without gain and with an empty left group are candidates too. score[k] belongs to the threshold
+# values[k], and is inf where values[k] equals values[k-1]
+def first_best(candidates):
+	best = min(np.min(score) for index, order, values, score in candidates)
+	for index, order, values, score in candidates:
+		tied = np.flatnonzero(score == best)
+		if len(tied) > 0:
+			# the presort is stable, so the first row of a run of equal values has the lowest row number
+			k = tied[np.argmin(order[tied])]
+			return index, values[k], score[k]
+
+# The terms (1 - sum of the squared class fractions)*size/n of gini_index for groups with the class
+# counts in the rows of counts and the given sizes, summed class by class in the same order
+def gini_terms(counts, size, n):
+	score = 0.0
+	for c in range(counts.shape[-1]):
+		p = counts[...,c] / size
+		score = score + p * p
+	return (1.0 - score) * (size / n)
+
+# Find the best split of the rows in orders (each feature's rows in sorted order) by the Gini index.
+# y holds the class codes 0,...,n_classes-1. The thresholds of a feature are swept in sorted order,
+# with running class counts of the left group, so every candidate costs O(n_classes) instead of O(n).
+# Rows count weights[row] times if weights are given (bootstrap counts, see forest.py), and only the
+# features listed in features are tried if they are given. Ties are broken as in first_best, with the
+# Gini indices rounded exactly as by gini_index
+def sorted_split(X, y, orders, n_classes, weights = None, features = None):
+	rows = orders[0]
+	if weights is None:
+		total = np.bincount(y[rows], minlength=n_classes).astype(float)
+		n = float(len(rows))
+		n_left = np.arange(1.0, n)
+	else:
+		total = np.bincount(y[rows], weights=weights[rows], minlength=n_classes)
+		n = np.sum(total)
+	# the lowest value as threshold puts everything right, with the Gini index of the whole group
+	parent = gini_terms(total, n, n)
+	candidates = list()
+	for index in (range(len(orders)) if features is None else features):
+		order = orders[index]
+		values = X[order,index]
+		counts = np.eye(n_classes)[y[order[:-1]]]
+		if weights is not None:
+			counts *= weights[order[:-1],np.newaxis]
+		left = np.cumsum(counts, axis=0)
+		if weights is not None:
+			n_left = np.sum(left, axis=1)
+		n_right = n - n_left
+		right = total - left
+		gini = np.empty(len(order))
+		gini[0] = parent
+		gini[1:] = gini_terms(left, n_left, n) + gini_terms(right, n_right, n)
+		# row[index] < value splits between two rows only where the sorted values increase
+		gini[1:][values[1:] == values[:-1]] = np.inf
+		candidates.append((index, order, values, gini))
+	return first_best(candidates)
+
+# Find the best split of the rows in orders by the mean squared error of the two groups around their
+# means (variance reduction), for regression targets y. The prefix sums of y and y^2 in sorted order
+# give the squared errors of both groups for every threshold in O(1). weights and features are as
+# for sorted_split, and ties are broken as in first_best
+def mse_split(X, y, orders, weights = None, features = None):
+	rows = orders[0]
+	w = np.ones(len(rows)) if weights is None else weights[rows]
+	n = np.sum(w)
+	# center the targets on the group mean, which keeps the prefix sums of y^2 accurate
+	center = np.dot(w, y[rows])/n
+	s, q = np.dot(w, y[rows] - center), np.dot(w, (y[rows] - center)**2)
+	# the lowest value as threshold puts everything right, with the variance of the whole group
+	parent = (q - s**2/n)/n
+	candidates = list()
+	for index in (range(len(orders)) if features is None else features):
+		order = orders[index]
+		values = X[order,index]
+		w = np.ones(len(order) - 1) if weights is None else weights[order[:-1]]
+		r = y[order[:-1]] - center
+		n_left, s_left, q_left = np.cumsum(w), np.cumsum(w*r), np.cumsum(w*r**2)
+		mse = np.empty(len(order))
+		mse[0] = parent
+		mse[1:] = (q_left - s_left**2/n_left + (q - q_left) - (s - s_left)**2/(n - n_left))/n
+		mse[1:][values[1:] == values[:-1]] = np.inf
+		candidates.append((index, order, values, mse))
+	return first_best(candidates)
+
 # Select the best split point for a dataset
 def get_split(dataset):
-	class_values = list(set(row[-1] for row in dataset))
-	b_index, b_value, b_score, b_groups = 999, 999, 999, None
-	for index in range(len(dataset[0])-1):
-		for row in dataset:
-			groups = test_split(index, row[index], dataset)
-			gini = gini_index(groups, class_values)
-			if gini < b_score:
-				b_index, b_value, b_score, b_groups = index, row[index], gini, groups
-	return {'index':b_index, 'value':b_value, 'groups':b_groups}
+	data = np.asarray(dataset, dtype=float)
+	classes, y = np.unique(data[:,-1], return_inverse=True)
+	b_index, b_value, b_score = sorted_split(data[:,:-1], y, presort(data[:,:-1]), len(classes))
+	return {'index':b_index, 'value':b_value, 'groups':test_split(b_index, b_value, dataset)}
  
 # Create a terminal node value
 def to_terminal(group):
@@ -127,11 +215,310 @@ def split(node, max_depth, min_size, depth):
 		node['right'] = get_split(right)
 		split(node['right'], max_depth, min_size, depth+1)
  
+# The growing functions below build classification trees (Gini index) from class codes y with their
+# classes, and regression trees (MSE criterion) from targets y with classes None
+
+# Find the best split of a node with the criterion of its tree
+def node_split(X, y, classes, orders, weights, features):
+	if classes is None:
+		return mse_split(X, y, orders, weights, features)
+	return sorted_split(X, y, orders, len(classes), weights, features)
+
+# Append the node of a group of rows to a growing tree, with its value (the majority class, or the
+# mean target of a regression tree), its impurity (Gini index, or variance) and its size, counting a
+# row weights[row] times if weights are given. Returns the number of the node
+def add_group(nodes, y, classes, rows, weights):
+	w = None if weights is None else weights[rows]
+	if classes is None:
+		mean = np.average(y[rows], weights=w)
+		return add_node(nodes, mean, np.average((y[rows] - mean)**2, weights=w), group_size(rows, weights))
+	counts = np.bincount(y[rows], weights=w, minlength=len(classes))
+	n = np.sum(counts)
+	return add_node(nodes, classes[np.argmax(counts)], 1.0 - np.sum(counts**2)/float(n)**2, n)
+
+# The features a node may split on: all of them, or a fresh random choice of max_features of the
+# d features (random forests), drawn with the generator rng
+def node_features(d, max_features, rng):
+	if max_features is None or max_features >= d:
+		return None
+	return np.sort(rng.choice(d, max_features, replace=False))
+
+# Number of training rows in a group, counting a row weights[row] times if weights are given
+def group_size(rows, weights):
+	return len(rows) if weights is None else np.sum(weights[rows])
+
+# A decision tree stored as parallel arrays, one entry per node, with the root as node 0. Node i sends
+# a row to node left[i] if row[feature[i]] < threshold[i] and to node right[i] otherwise. Leaves have
+# feature -1, and value[i] is the prediction of node i (the majority class of its training rows).
+# impurity[i] and size[i] are the impurity and the number of the training rows of node i, kept for
+# pruning. Nodes are numbered parents first, and the subtree of a node is its left subtree followed by
+# its right subtree, so every subtree is a range of node numbers
+class FlatTree(object):
+	__slots__ = ('feature', 'threshold', 'left', 'right', 'value', 'impurity', 'size')
+
+	def __init__(self, feature, threshold, left, right, value, impurity = None, size = None):
+		self.feature = np.asarray(feature, dtype=np.intp)
+		self.threshold = np.asarray(threshold, dtype=float)
+		self.left = np.asarray(left, dtype=np.intp)
+		self.right = np.asarray(right, dtype=np.intp)
+		self.value = np.asarray(value)
+		self.impurity = np.zeros(len(self.value)) if impurity is None else np.asarray(impurity, dtype=float)
+		self.size = np.zeros(len(self.value)) if size is None else np.asarray(size, dtype=float)
+
+	# Number of the leaf reached by every row of X. All rows move down one level at a time,
+	# so there is one vectorized step per level instead of one Python call per row and level
+	def apply(self, X):
+		X = np.asarray(X, dtype=float)
+		node = np.zeros(len(X), dtype=np.intp)
+		rows = np.flatnonzero(self.feature[node] >= 0)
+		while len(rows) > 0:
+			at = node[rows]
+			go_left = X[rows,self.feature[at]] < self.threshold[at]
+			node[rows] = np.where(go_left, self.left[at], self.right[at])
+			rows = rows[self.feature[node[rows]] >= 0]
+		return node
+
+	# Make predictions for all rows of X
+	def predict(self, X):
+		return self.value[self.apply(X)]
+
+	# Level of every node, the root being on level 1
+	def levels(self):
+		level = np.ones(len(self.value), dtype=np.intp)
+		for i in np.flatnonzero(self.feature >= 0):
+			level[self.left[i]] = level[self.right[i]] = level[i] + 1
+		return level
+
+	# The tree with the nodes where leaf is True made leaves: the nodes below them are never reached.
+	# Every node already holds the prediction of its training rows, so nothing is recomputed
+	def collapsed(self, leaf):
+		return FlatTree(np.where(leaf, -1, self.feature), self.threshold, self.left, self.right, self.value,
+			self.impurity, self.size)
+
+	# The tree as grown with a smaller max_depth: the nodes below level max_depth split no more
+	def truncated(self, max_depth):
+		return self.collapsed(self.levels() > max_depth)
+
+	# Nested dictionary form of the tree, as used by predict(node, row)
+	def to_dict(self, i = 0):
+		if self.feature[i] < 0:
+			return {'index':0, 'value':-np.inf, 'left':self.value[i], 'right':self.value[i]}
+		node = {'index':self.feature[i], 'value':self.threshold[i]}
+		for name, child in (('left', self.left[i]), ('right', self.right[i])):
+			node[name] = self.value[child] if self.feature[child] < 0 else self.to_dict(child)
+		return node
+
+# Append a node to the lists of a growing tree (see FlatTree) and return its number
+def add_node(nodes, value, impurity = 0.0, size = 0.0, feature = -1, threshold = 0.0):
+	for name, item in zip(FlatTree.__slots__, (feature, threshold, -1, -1, value, impurity, size)):
+		nodes[name].append(item)
+	return len(nodes['value']) - 1
+
+# Split the rows in orders and create the children, or make terminal, adding the nodes to nodes.
+# The children inherit the sorted orders of their rows, so the features are only sorted once at
+# the root. side is a work array with one entry per row of X, telling which rows of the group go left.
+# weights, max_features and rng are passed on to sorted_split and node_features
+def grow(X, y, classes, orders, side, max_depth, min_size, depth, nodes, weights = None, max_features = None, rng = None):
+	rows = orders[0]
+	node = add_group(nodes, y, classes, rows, weights)
+	features = node_features(len(orders), max_features, rng)
+	index, value, score = node_split(X, y, classes, orders, weights, features)
+	side[rows] = X[rows,index] < value
+	mask = side[orders]
+	n, n_left = len(rows), np.count_nonzero(mask[0])
+	# check for a no split
+	if n_left == 0 or n_left == n:
+		return node
+	nodes['feature'][node], nodes['threshold'][node] = index, value
+	children = (orders[mask].reshape(len(orders), n_left), orders[~mask].reshape(len(orders), n-n_left))
+	for name, child in zip(('left', 'right'), children):
+		# check for max depth and min size
+		if depth >= max_depth or group_size(child[0], weights) <= min_size:
+			nodes[name][node] = add_group(nodes, y, classes, child[0], weights)
+		else:
+			nodes[name][node] = grow(X, y, classes, child, side, max_depth, min_size, depth+1, nodes, weights, max_features, rng)
+	return node
+
+# Quantize every feature once into at most max_bins (<= 256) bins, at quantiles of its values.
+# Returns the bin numbers B as uint8 (8 times less memory than the features) and the bin edges:
+# a row is in bin b of feature f when edges[f][b-1] <= row[f] < edges[f][b]
+def bin_features(X, max_bins = 256):
+	if max_bins > 256:
+		raise ValueError('max_bins must be at most 256 for uint8 bins')
+	X = np.asarray(X, dtype=float)
+	B = np.empty(X.shape, dtype=np.uint8)
+	edges = list()
+	for f in range(X.shape[1]):
+		values = np.unique(X[:,f])
+		if len(values) > max_bins:
+			values = np.unique(np.quantile(X[:,f], np.linspace(0, 1, max_bins), method='lower'))
+		edges.append(values[1:])
+		B[:,f] = np.searchsorted(edges[f], X[:,f], side='right')
+	return B, edges
+
+# Histograms of the binned features over the given rows: hist[f, b, k] is the sum of w[row, k]
+# over the rows in bin b of feature f (w holds one-hot classes, or gradients for boosting)
+def histogram(B, rows, w, n_bins):
+	d = B.shape[1]
+	index = (B[rows].astype(np.intp) + n_bins*np.arange(d)).ravel()
+	hist = np.empty((d*n_bins, w.shape[1]))
+	for k in range(w.shape[1]):
+		hist[:,k] = np.bincount(index, weights=np.repeat(w[rows,k], d), minlength=d*n_bins)
+	return hist.reshape(d, n_bins, w.shape[1])
+
+# Find the best split by the Gini index from the class histograms of a node, for all features and
+# bins at once: bins < b go left. Returns the feature, the bin b and the Gini index, or feature -1
+# if no split is better than the node itself. Only the features listed in features are tried if given
+def hist_split(hist, features = None):
+	left = np.cumsum(hist, axis=1)[:,:-1]
+	total = np.sum(hist[0], axis=0)
+	right = total - left
+	n = np.sum(total)
+	n_left = np.sum(left, axis=2)
+	n_right = n - n_left
+	with np.errstate(divide='ignore', invalid='ignore'):
+		gini = (n_left - np.sum(left**2, axis=2)/n_left + n_right - np.sum(right**2, axis=2)/n_right)/n
+	gini[(n_left == 0) | (n_right == 0)] = np.inf
+	if features is not None:
+		skipped = np.ones(len(hist), dtype=bool)
+		skipped[features] = False
+		gini[skipped] = np.inf
+	index, b = np.unravel_index(np.argmin(gini), gini.shape)
+	parent = (n - np.sum(total**2)/n)/n
+	if not gini[index,b] < parent:
+		return -1, 0, parent
+	return index, b+1, gini[index,b]
+
+# The MSE criterion version of hist_split, for the histograms of regression trees: hist[f, b] holds
+# the number of rows in bin b of feature f and the sums of their y and y^2
+def hist_mse_split(hist, features = None):
+	left = np.cumsum(hist, axis=1)[:,:-1]
+	total = np.sum(hist[0], axis=0)
+	right = total - left
+	n = total[0]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		mse = (left[:,:,2] - left[:,:,1]**2/left[:,:,0] + right[:,:,2] - right[:,:,1]**2/right[:,:,0])/n
+	mse[(left[:,:,0] <= 0) | (right[:,:,0] <= 0)] = np.inf
+	if features is not None:
+		skipped = np.ones(len(hist), dtype=bool)
+		skipped[features] = False
+		mse[skipped] = np.inf
+	index, b = np.unravel_index(np.argmin(mse), mse.shape)
+	parent = (total[2] - total[1]**2/n)/n
+	if not mse[index,b] < parent:
+		return -1, 0, parent
+	return index, b+1, mse[index,b]
+
+# Hist mode version of grow: the split of a node is found from its histograms alone. Only the
+# histogram of the smaller child is counted, the other one is the parent's minus its sibling's
+def grow_hist(B, edges, y, classes, w, rows, hist, max_depth, min_size, depth, nodes, weights = None, max_features = None, rng = None):
+	node = add_group(nodes, y, classes, rows, weights)
+	features = node_features(len(hist), max_features, rng)
+	index, b, score = hist_split(hist, features) if classes is not None else hist_mse_split(hist, features)
+	if index < 0:
+		return node
+	nodes['feature'][node], nodes['threshold'][node] = index, edges[index][b-1]
+	go_left = B[rows,index] < b
+	children = (rows[go_left], rows[~go_left])
+	grows = [depth < max_depth and group_size(child, weights) > min_size for child in children]
+	hists = [None, None]
+	if any(grows):
+		small = 0 if len(children[0]) <= len(children[1]) else 1
+		hists[small] = histogram(B, children[small], w, hist.shape[1])
+		hists[1-small] = hist - hists[small]
+	for name, child, child_hist, grows_child in zip(('left', 'right'), children, hists, grows):
+		if grows_child:
+			nodes[name][node] = grow_hist(B, edges, y, classes, w, child, child_hist, max_depth, min_size, depth+1, nodes, weights, max_features, rng)
+		else:
+			nodes[name][node] = add_group(nodes, y, classes, child, weights)
+	return node
+
+# Build a decision tree as a FlatTree, from a feature matrix X and the labels of its rows.
+# mode 'exact' tries every threshold (see sorted_split), mode 'hist' only the edges of at most
+# max_bins bins per feature (see bin_features), which scales to millions of rows. The binning
+# (B, edges) of X can be passed as bins, and its presort(X) as orders, to reuse them for several trees.
+# A row counts weights[row] times (rows of weight 0 are left out), and every node splits on its best
+# of max_features random features (all if None), drawn with the numpy Generator rng. criterion 'gini'
+# builds a classification tree, 'mse' a regression tree of real labels whose leaves hold mean values
+def build_flat_tree(X, labels, max_depth, min_size, mode = 'exact', max_bins = 256, bins = None,
+		weights = None, max_features = None, rng = None, orders = None, criterion = 'gini'):
+	if criterion == 'gini':
+		classes, y = np.unique(labels, return_inverse=True)
+	elif criterion == 'mse':
+		classes, y = None, np.ravel(np.asarray(labels, dtype=float))
+	else:
+		raise ValueError("Unknown criterion %s, use 'gini' or 'mse'" % criterion)
+	nodes = dict((name, []) for name in FlatTree.__slots__)
+	if max_features is not None and rng is None:
+		rng = np.random.default_rng()
+	if weights is not None:
+		weights = np.asarray(weights, dtype=float)
+	if mode == 'exact':
+		X = np.asarray(X, dtype=float)
+		orders = presort(X) if orders is None else orders
+		if weights is not None:
+			orders = orders[weights[orders] > 0].reshape(len(orders), -1)
+		grow(X, y, classes, orders, np.zeros(len(X), dtype=bool), max_depth, min_size, 1, nodes, weights, max_features, rng)
+	elif mode == 'hist':
+		B, edges = bin_features(X, max_bins) if bins is None else bins
+		n_bins = max(len(e) for e in edges) + 1
+		if classes is None:
+			# counts and sums of y and y^2, centered on the mean to keep the sums of y^2 accurate
+			r = y - np.mean(y)
+			w = np.column_stack((np.ones(len(y)), r, r**2))
+		else:
+			w = np.eye(len(classes))[y]
+		if weights is None:
+			rows = np.arange(len(y))
+		else:
+			w *= weights[:,np.newaxis]
+			rows = np.flatnonzero(weights > 0)
+		grow_hist(B, edges, y, classes, w, rows, histogram(B, rows, w, n_bins), max_depth, min_size, 1, nodes, weights, max_features, rng)
+	else:
+		raise ValueError("Unknown mode %s, use 'exact' or 'hist'" % mode)
+	return FlatTree(**nodes)
+
+# Minimal cost-complexity pruning of a grown tree. The cost of a tree is the sum of size*impurity over
+# its leaves, relative to the size of the root, plus alpha per leaf. As alpha grows, the weakest links
+# (the nodes whose subtree lowers the cost the least per extra leaf) are made leaves one after
+# the other. Returns the alphas where this happens, starting with 0, the cost without alpha of the
+# tree pruned at each of them, and for every node the alpha from which it is a leaf, so that the
+# pruned tree for any alpha is tree.collapsed(collapse <= alpha)
+def cost_complexity_path(tree):
+	leaf = tree.feature < 0
+	collapse = np.where(leaf, 0.0, np.inf)
+	cost = tree.impurity*tree.size/tree.size[0]
+	level = tree.levels()
+	# the subtree of node i is the nodes i,...,end[i]-1
+	end = np.arange(1, len(leaf) + 1)
+	for i in np.flatnonzero(~leaf)[::-1]:
+		end[i] = end[tree.right[i]]
+	by_level = [np.flatnonzero(~leaf & (level == l)) for l in range(np.max(level), 0, -1)]
+	alphas, costs = [0.0], list()
+	while True:
+		# costs and numbers of leaves of all subtrees, children before parents
+		subtree_cost, n_leaves = cost.copy(), np.ones(len(leaf))
+		for nodes in by_level:
+			nodes = nodes[~leaf[nodes]]
+			subtree_cost[nodes] = subtree_cost[tree.left[nodes]] + subtree_cost[tree.right[nodes]]
+			n_leaves[nodes] = n_leaves[tree.left[nodes]] + n_leaves[tree.right[nodes]]
+		costs.append(subtree_cost[0])
+		if leaf[0]:
+			break
+		with np.errstate(divide='ignore', invalid='ignore'):
+			g = np.where(leaf, np.inf, (cost - subtree_cost)/(n_leaves - 1))
+		alpha = max(np.min(g), alphas[-1])
+		alphas.append(alpha)
+		for i in np.flatnonzero(g <= alpha*(1 + 1e-12)):
+			if not leaf[i]:
+				leaf[i:end[i]] = True
+				collapse[i:end[i]] = np.minimum(collapse[i:end[i]], alpha)
+	return np.array(alphas[:len(costs)]), np.array(costs), collapse
+
 # Build a decision tree
 def build_tree(train, max_depth, min_size):
-	root = get_split(train)
-	split(root, max_depth, min_size, 1)
-	return root
+	data = np.asarray(train, dtype=float)
+	return build_flat_tree(data[:,:-1], data[:,-1], max_depth, min_size).to_dict()
  
 # Make a prediction with a decision tree
 def predict(node, row):
@@ -147,26 +534,22 @@ def predict(node, row):
 			return node['right']
  
 # Classification and Regression Tree Algorithm
-def decision_tree(train, test, max_depth, min_size):
-	tree = build_tree(train, max_depth, min_size)
-	predictions = list()
-	for row in test:
-		prediction = predict(tree, row)
-		predictions.append(prediction)
-	return(predictions)
+def decision_tree(X_train, y_train, X_test, max_depth, min_size, mode = 'exact'):
+	return build_flat_tree(X_train, y_train, max_depth, min_size, mode).predict(X_test)
  
-# Test CART on Bank Note dataset
-seed(1)
-# load and prepare data
-filename = 'DataFiles/rideclass.csv'
-dataset = load_csv(filename)
-# convert string attributes to integers
-for i in range(len(dataset[0])):
-	str_column_to_float(dataset, i)
-# evaluate algorithm
-n_folds = 5
-max_depth = 5
-min_size = 10
-scores = evaluate_algorithm(dataset, decision_tree, n_folds, max_depth, min_size)
-print('Scores: %s' % scores)
-print('Mean Accuracy: %.3f%%' % (sum(scores)/float(len(scores))))
+if __name__ == '__main__':
+	# Test CART on Bank Note dataset
+	# load and prepare data
+	filename = 'DataFiles/rideclass.csv'
+	dataset = load_csv(filename)
+	# convert string attributes to integers
+	for i in range(len(dataset[0])):
+		str_column_to_float(dataset, i)
+	# evaluate algorithm
+	n_folds = 5
+	max_depth = 5
+	min_size = 10
+	data = np.array(dataset, dtype=float)
+	scores = evaluate_algorithm(data[:,:-1], data[:,-1], decision_tree, n_folds, max_depth, min_size, seed=1)
+	print('Scores: %s' % scores)
+	print('Mean Accuracy: %.3f%%' % (sum(scores)/float(len(scores))))
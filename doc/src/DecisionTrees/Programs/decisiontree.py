@@ -1,6 +1,7 @@
 import re
 import math
 from collections import deque
+import numpy as np
 
 # x is examples in training set
 # y is set of attributes
@@ -14,102 +15,160 @@ class Node(object):
 		self.next = None
 		self.childs = None
 
+# Flat form of a decision tree, stored as arrays with one entry per node (the root is node 0).
+# attribute[i] is the attribute tested at node i, or -1 for a leaf, and child[i, c] is the node
+# reached when that attribute has the value with code c (-1 if no training sample had it).
+# label[i] is the code of the prediction at node i, the dominant label of the training samples
+# reaching it. valueCodes[a] maps the values of attribute a to their codes
+class FlatDecisionTree(object):
+	__slots__ = ('attribute', 'child', 'label', 'valueCodes')
+
+	def __init__(self, attribute, child, label, valueCodes):
+		self.attribute = np.asarray(attribute, dtype=np.intp)
+		self.child = np.asarray(child, dtype=np.intp).reshape(len(self.attribute), -1)
+		self.label = np.asarray(label, dtype=np.intp)
+		self.valueCodes = valueCodes
+
+	# Integer codes of the attribute values of the samples (-1 for unseen values), one column per attribute
+	def encode(self, samples):
+		samples = np.asarray(samples, dtype=object).reshape(len(samples), -1)
+		codes = np.full(samples.shape, -1, dtype=np.intp)
+		for a, valueCodes in enumerate(self.valueCodes):
+			vals, inverse = np.unique(samples[:,a].astype(str), return_inverse=True)
+			codes[:,a] = np.array([valueCodes.get(v, -1) for v in vals], dtype=np.intp)[inverse]
+		return codes
+
+	# Nodes where the encoded samples stop: a leaf, or the node whose attribute value was unseen.
+	# All samples move down one level at a time with vectorized lookups
+	def apply(self, codes):
+		node = np.zeros(len(codes), dtype=np.intp)
+		rows = np.flatnonzero(self.attribute[node] >= 0)
+		while len(rows) > 0:
+			at = node[rows]
+			value = codes[rows,self.attribute[at]]
+			nxt = np.where(value >= 0, self.child[at,np.maximum(value, 0)], -1)
+			moving = nxt >= 0
+			node[rows[moving]] = nxt[moving]
+			rows = rows[moving]
+			rows = rows[self.attribute[node[rows]] >= 0]
+		return node
+
+	# Label codes predicted for the encoded samples
+	def predict(self, codes):
+		return self.label[self.apply(codes)]
+
 # Simple class of Decision Tree
-# Aimed for who want to learn Decision Tree, so it is not optimized
+# The samples and labels are encoded as integer arrays once, and all counting is done with np.bincount
+# on these codes, so that every node costs O(samples * attributes)
 class DecisionTree(object):
-	def __init__(self, sample, attributes, labels):
+	def __init__(self, sample, attributes, labels, gainRatio = False):
 		self.sample = sample
 		self.attributes = attributes
 		self.labels = labels
+		self.gainRatio = gainRatio  # split on the C4.5 gain ratio instead of the ID3 information gain
 		self.labelCodes = None
 		self.labelCodesCount = None
 		self.initLabelCodes()
+		self.initSampleCodes()
 		# print(self.labelCodes)
 		self.root = None
-		self.entropy = self.getEntropy([x for x in range(len(self.labels))])
+		self.flat = None
+		self.entropy = self.getEntropy(np.arange(len(self.labels)))
 
 	def initLabelCodes(self):
-		self.labelCodes = []
-		self.labelCodesCount = []
-		for l in self.labels:
-			if l not in self.labelCodes:
-				self.labelCodes.append(l)
-				self.labelCodesCount.append(0)
-			self.labelCodesCount[self.labelCodes.index(l)] += 1
+		# label codes in order of first appearance, y[sid] is the code of sample sid
+		vals, first, inverse = np.unique(np.asarray(self.labels, dtype=str), return_index=True, return_inverse=True)
+		order = np.argsort(first)
+		rank = np.empty(len(order), dtype=np.intp)
+		rank[order] = np.arange(len(order))
+		self.y = rank[inverse]
+		self.labelCodes = [self.labels[i] for i in first[order]]
+		self.labelCodesCount = list(np.bincount(self.y, minlength=len(self.labelCodes)))
+
+	def initSampleCodes(self):
+		# codes[sid, a] is the code of the value of attribute a in sample sid, and
+		# valueCodes[a] maps the values of attribute a to their codes
+		sample = np.asarray(self.sample, dtype=str).reshape(len(self.sample), -1)
+		self.codes = np.empty(sample.shape, dtype=np.intp)
+		self.valueCodes = []
+		self.attributeValues = []
+		for a in range(sample.shape[1]):
+			# value codes in order of first appearance, as the label codes
+			vals, first, inverse = np.unique(sample[:,a], return_index=True, return_inverse=True)
+			order = np.argsort(first)
+			rank = np.empty(len(order), dtype=np.intp)
+			rank[order] = np.arange(len(order))
+			self.codes[:,a] = rank[inverse]
+			self.valueCodes.append(dict((v, c) for c, v in enumerate(vals[order])))
+			self.attributeValues.append([self.sample[i][a] for i in first[order]])
+		self.nValues = max([len(v) for v in self.valueCodes] + [1])
 
 	def getLabelCodeId(self, sampleId):
-		return self.labelCodes.index(self.labels[sampleId])
+		return self.y[sampleId]
+
+	# Codes of the values of attributeId among sampleIds, in order of their first appearance there
+	def getPresentCodes(self, sampleIds, attributeId):
+		present, first = np.unique(self.codes[sampleIds,attributeId], return_index=True)
+		return present[np.argsort(first)]
 
 	def getAttributeValues(self, sampleIds, attributeId):
-		vals = []
-		for sid in sampleIds:
-			val = self.sample[sid][attributeId]
-			if val not in vals:
-				vals.append(val)
-		# print(vals)
-		return vals
+		return [self.attributeValues[attributeId][c] for c in self.getPresentCodes(sampleIds, attributeId)]
 
 	def getEntropy(self, sampleIds):
-		entropy = 0
-		labelCount = [0] * len(self.labelCodes)
-		for sid in sampleIds:
-			labelCount[self.getLabelCodeId(sid)] += 1
-		# print("-ge", labelCount)
-		for lv in labelCount:
-			# print(lv)
-			if lv != 0:
-				entropy += -lv/len(sampleIds) * math.log(lv/len(sampleIds), 2)
-			else:
-				entropy += 0
-		return entropy
+		labelCount = np.bincount(self.y[sampleIds], minlength=len(self.labelCodes))
+		return self.countsEntropy(labelCount)
+
+	# Entropy (in bits) of the distributions given by counts along the last axis
+	def countsEntropy(self, counts):
+		total = np.sum(counts, axis=-1, keepdims=True)
+		p = counts / np.maximum(total, 1)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			return -np.sum(np.where(counts > 0, p * np.log2(p), 0.0), axis=-1)
 
 	def getDominantLabel(self, sampleIds):
-		labelCodesCount = [0] * len(self.labelCodes)
-		for sid in sampleIds:
-			labelCodesCount[self.labelCodes.index(self.labels[sid])] += 1
-		return self.labelCodes[labelCodesCount.index(max(labelCodesCount))]
+		labelCodesCount = np.bincount(self.y[sampleIds], minlength=len(self.labelCodes))
+		return self.labelCodes[np.argmax(labelCodesCount)]
 
-	def getInformationGain(self, sampleIds, attributeId):
-		gain = self.getEntropy(sampleIds)
-		attributeVals = []
-		attributeValsCount = []
-		attributeValsIds = []
-		for sid in sampleIds:
-			val = self.sample[sid][attributeId]
-			if val not in attributeVals:
-				attributeVals.append(val)
-				attributeValsCount.append(0)
-				attributeValsIds.append([])
-			vid = attributeVals.index(val)
-			attributeValsCount[vid] += 1
-			attributeValsIds[vid].append(sid)
-		# print("-gig", self.attributes[attributeId])
-		for vc, vids in zip(attributeValsCount, attributeValsIds):
-			# print("-gig", vids)
-			gain -= vc/len(sampleIds) * self.getEntropy(vids)
+	# Information gains (or gain ratios) of all attributeIds at once, from the contingency tables
+	# table[a, v, l] = number of samples with value code v of attribute a and label code l,
+	# counted by one np.bincount
+	def getInformationGains(self, sampleIds, attributeIds):
+		sampleIds = np.asarray(sampleIds, dtype=np.intp)
+		attributeIds = np.asarray(attributeIds, dtype=np.intp)
+		nLabels = len(self.labelCodes)
+		index = (np.arange(len(attributeIds)) * self.nValues + self.codes[np.ix_(sampleIds, attributeIds)]) * nLabels
+		index += self.y[sampleIds][:,None]
+		table = np.bincount(index.ravel(), minlength=len(attributeIds) * self.nValues * nLabels)
+		table = table.reshape(len(attributeIds), self.nValues, nLabels)
+		valueCount = np.sum(table, axis=2)
+		n = len(sampleIds)
+		gain = self.getEntropy(sampleIds) - np.sum(valueCount / n * self.countsEntropy(table), axis=1)
+		if self.gainRatio:
+			splitInfo = self.countsEntropy(valueCount)
+			gain = np.where(splitInfo > 0, gain / np.where(splitInfo > 0, splitInfo, 1), 0.0)
 		return gain
 
+	def getInformationGain(self, sampleIds, attributeId):
+		return self.getInformationGains(sampleIds, [attributeId])[0]
+
 	def getAttributeMaxInformationGain(self, sampleIds, attributeIds):
-		attributesEntropy = [0] * len(attributeIds)
-		for i, attId in zip(range(len(attributeIds)), attributeIds):
-			attributesEntropy[i] = self.getInformationGain(sampleIds, attId)
-		maxId = attributeIds[attributesEntropy.index(max(attributesEntropy))]
+		attributesEntropy = self.getInformationGains(sampleIds, attributeIds)
+		# equal gains (up to rounding) go to the first of these attributes
+		best = np.flatnonzero(attributesEntropy >= np.max(attributesEntropy) - 1e-12)[0]
+		maxId = attributeIds[best]
 		return self.attributes[maxId], maxId
 
 	def isSingleLabeled(self, sampleIds):
-		label = self.labels[sampleIds[0]]
-		for sid in sampleIds:
-			if self.labels[sid] != label:
-				return False
-		return True
+		return bool(np.all(self.y[sampleIds] == self.y[sampleIds[0]]))
 
 	def getLabel(self, sampleId):
 		return self.labels[sampleId]
 
 	def id3(self):
-		sampleIds = [x for x in range(len(self.sample))]
-		attributeIds = [x for x in range(len(self.attributes))]
+		sampleIds = np.arange(len(self.sample))
+		attributeIds = np.arange(len(self.attributes))
 		self.root = self.id3Recv(sampleIds, attributeIds, self.root)
+		self.flat = None
 
 	def id3Recv(self, sampleIds, attributeIds, root):
 		root = Node() # Initialize current root
@@ -125,28 +184,58 @@ class DecisionTree(object):
 		# print(bestAttrName)
 		root.value = bestAttrName
 		root.childs = []  # Create list of children
-		for value in self.getAttributeValues(sampleIds, bestAttrId):
-			# print(value)
+		# the attribute is used up on this path only
+		childAttributeIds = attributeIds[attributeIds != bestAttrId]
+		# partition the samples by their value of the attribute, with one stable sort
+		values = self.codes[sampleIds,bestAttrId]
+		order = np.argsort(values, kind='stable')
+		counts = np.bincount(values, minlength=self.nValues)
+		groups = np.split(sampleIds[order], np.cumsum(counts)[:-1])
+		for code in self.getPresentCodes(sampleIds, bestAttrId):
 			child = Node()
-			child.value = value
+			child.value = self.attributeValues[bestAttrId][code]
 			root.childs.append(child)  # Append new child node to current
 									   # root
-			childSampleIds = []
-			for sid in sampleIds:
-				if self.sample[sid][bestAttrId] == value:
-					childSampleIds.append(sid)
-			if len(childSampleIds) == 0:
-				child.next = self.getDominantLabel(sampleIds)
-			else:
-				# print(bestAttrName, bestAttrId)
-				# print(attributeIds)
-				if len(attributeIds) > 0 and bestAttrId in attributeIds:
-					toRemove = attributeIds.index(bestAttrId)
-					attributeIds.pop(toRemove)
-				child.next = self.id3Recv(
-					childSampleIds, attributeIds, child.next)
+			child.next = self.id3Recv(groups[code], childAttributeIds, child.next)
 		return root
 
+	# Flat (array) form of the tree, see FlatDecisionTree
+	def flatten(self):
+		attribute, child, label = [], [], []
+		nodes = deque([self.root])  # breadth first, so the children of a node get consecutive numbers
+		while len(nodes) > 0:
+			node = nodes.popleft()
+			child.append([-1] * self.nValues)
+			if node.childs:
+				attribute.append(self.attributes.index(node.value))
+				label.append(-1)
+				for c in node.childs:
+					child[-1][self.valueCodes[attribute[-1]][str(c.value)]] = len(attribute) + len(nodes)
+					nodes.append(c.next)
+			else:
+				attribute.append(-1)
+				label.append(self.labelCodes.index(node.value))
+		flat = FlatDecisionTree(attribute, child, label, self.valueCodes)
+		# inner nodes predict the dominant label of the training samples reaching them,
+		# found by routing all samples down one level at a time
+		counts = np.zeros((len(attribute), len(self.labelCodes)), dtype=np.intp)
+		node = np.zeros(len(self.codes), dtype=np.intp)
+		rows = np.arange(len(self.codes))
+		while len(rows) > 0:
+			np.add.at(counts, (node[rows], self.y[rows]), 1)
+			rows = rows[flat.attribute[node[rows]] >= 0]
+			at = node[rows]
+			node[rows] = flat.child[at,self.codes[rows,flat.attribute[at]]]
+		inner = flat.attribute >= 0
+		flat.label[inner] = np.argmax(counts[inner], axis=1)
+		return flat
+
+	# Predict the labels of a list of samples, all at once with the flat form of the tree
+	def predict(self, samples):
+		if self.flat is None:
+			self.flat = self.flatten()
+		return [self.labelCodes[c] for c in self.flat.predict(self.flat.encode(samples))]
+
 	def printTree(self):
 		if self.root:
 			roots = deque()
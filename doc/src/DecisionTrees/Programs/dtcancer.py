@@ -9,6 +9,7 @@ from IPython.display import Image
 from pydot import graph_from_dot_data
 import pandas as pd
 import numpy as np
+from cart import build_flat_tree, cost_complexity_path
 
 
 # Where to save the figures and data files
@@ -55,3 +56,16 @@ export_graphviz(
 )
 cmd = 'dot -Tpng DataFiles/cancer.dot -o DataFiles/cancer.png'
 os.system(cmd)
+
+# Depth and pruning sweeps with the CART code: the tree is grown once to full depth, and every node
+# keeps its prediction, impurity and size, so each smaller tree is a lookup instead of a new fit
+X_train, X_test, y_train, y_test = train_test_split(cancer.data, cancer.target, random_state=1)
+full_tree = build_flat_tree(X_train, y_train, max_depth=len(y_train), min_size=1)
+for depth in range(1, np.max(full_tree.levels())):
+    accuracy = np.mean(full_tree.truncated(depth).predict(X_test) == y_test)
+    print('max_depth {}: test accuracy {:.3f}'.format(depth, accuracy))
+alphas, costs, collapse = cost_complexity_path(full_tree)
+for alpha, cost in zip(alphas, costs):
+    tree = full_tree.collapsed(collapse <= alpha)
+    accuracy = np.mean(tree.predict(X_test) == y_test)
+    print('alpha {:.5f}: training impurity {:.4f}, test accuracy {:.3f}'.format(alpha, cost, accuracy))
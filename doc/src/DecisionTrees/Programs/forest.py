@@ -0,0 +1,170 @@
+# Random forests on the CART engine of cart.py. Every tree grows on a bootstrap sample of the rows,
+# given as bootstrap counts (the weights of build_flat_tree), so all trees share one copy of the
+# training arrays and one presort or binning of the features. Every node splits on its best of
+# max_features random features. The trees grow in a process pool whose workers map the training
+# arrays from shared memory, and every tree predicts its out-of-bag rows as it is grown
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from cart import presort, bin_features, build_flat_tree, FlatTree
+
+_train = dict() # the training arrays and options of the running fit, in every worker process
+_blocks = list() # the shared memory blocks behind _train, kept open while the worker lives
+
+# Initializer of the workers: map the shared memory blocks described by specs
+# (name -> (block name, shape, dtype)) as arrays, without copying them
+def _attach(specs, options):
+	for name, (block_name, shape, dtype) in specs.items():
+		block = shared_memory.SharedMemory(name=block_name)
+		_blocks.append(block)
+		_train[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+	_train.update(options)
+
+# The tree with its thresholds replaced by bin numbers, so that it applies to the binned features B
+# of bin_features: row[f] < edges[f][b-1] exactly when B[row,f] < b
+def binned_tree(tree, edges):
+	threshold = [np.searchsorted(edges[f], t) + 1 if f >= 0 else 0 for f, t in zip(tree.feature, tree.threshold)]
+	return FlatTree(tree.feature, threshold, tree.left, tree.right, tree.value)
+
+# Grow one tree of the running fit on a bootstrap sample drawn with the seed sequence seed.
+# Returns the tree, its out-of-bag rows and its predictions for them
+def _grow_tree(seed):
+	rng = np.random.default_rng(seed)
+	y, options = _train['y'], _train['options']
+	n = len(y)
+	counts = np.bincount(rng.integers(0, n, n), minlength=n)
+	oob = np.flatnonzero(counts == 0)
+	if options['mode'] == 'exact':
+		X = _train['X']
+		tree = build_flat_tree(X, y, options['max_depth'], options['min_size'], weights=counts,
+			max_features=options['max_features'], rng=rng, orders=_train['orders'], criterion=options['criterion'])
+		predicted = tree.predict(X[oob])
+	else:
+		B, edges = _train['B'], options['edges']
+		tree = build_flat_tree(None, y, options['max_depth'], options['min_size'], 'hist', bins=(B, edges),
+			weights=counts, max_features=options['max_features'], rng=rng, criterion=options['criterion'])
+		predicted = binned_tree(tree, edges).predict(B[oob])
+	return tree, oob, predicted
+
+# R2 score of the predictions p of the targets y
+def r2_score(y, p):
+	return 1.0 - np.sum((y - p)**2)/np.sum((y - np.mean(y))**2)
+
+# Number of features tried at every node: 'sqrt' or 'log2' of the d features, a fraction of them,
+# a number of them, or all of them (None, plain bagging)
+def n_node_features(max_features, d):
+	if max_features is None:
+		return d
+	if max_features == 'sqrt':
+		return max(1, int(np.sqrt(d)))
+	if max_features == 'log2':
+		return max(1, int(np.log2(d)))
+	if isinstance(max_features, float):
+		return max(1, int(max_features*d))
+	return min(int(max_features), d)
+
+# A random forest of classification trees (criterion 'gini') or regression trees (criterion 'mse').
+# fit grows n_trees trees with n_jobs processes (by default 1, no pool; all CPUs if None, which needs
+# the calling script's driver code under if __name__ == '__main__'); the forest is the same for any
+# n_jobs, given the seed. mode, max_bins, max_depth and min_size are those of
+# build_flat_tree. After fit, oob_score is the out-of-bag accuracy (R2 score for regression) and
+# oob_votes[i, k] counts the trees that predict class k for training row i without having seen it,
+# or oob_prediction[i] is the mean prediction of these trees for regression
+class RandomForest(object):
+
+	def __init__(self, n_trees = 100, max_depth = 10, min_size = 1, max_features = 'sqrt', mode = 'exact',
+			max_bins = 256, n_jobs = 1, seed = None, criterion = 'gini'):
+		if mode not in ('exact', 'hist'):
+			raise ValueError("Unknown mode %s, use 'exact' or 'hist'" % mode)
+		if criterion not in ('gini', 'mse'):
+			raise ValueError("Unknown criterion %s, use 'gini' or 'mse'" % criterion)
+		self.n_trees, self.max_depth, self.min_size = n_trees, max_depth, min_size
+		self.max_features, self.mode, self.max_bins = max_features, mode, max_bins
+		self.n_jobs, self.seed, self.criterion = n_jobs, seed, criterion
+
+	# Grow the trees on the rows of X with the given labels (targets for regression)
+	def fit(self, X, labels):
+		X = np.asarray(X, dtype=float)
+		if self.criterion == 'gini':
+			self.classes, y = np.unique(labels, return_inverse=True)
+		else:
+			self.classes, y = None, np.ravel(np.asarray(labels, dtype=float))
+		arrays = {'y': y}
+		options = {'mode': self.mode, 'max_depth': self.max_depth, 'min_size': self.min_size,
+			'max_features': n_node_features(self.max_features, X.shape[1]), 'criterion': self.criterion}
+		if self.mode == 'exact':
+			arrays['X'], arrays['orders'] = X, presort(X)
+		else:
+			arrays['B'], options['edges'] = bin_features(X, self.max_bins)
+		seeds = np.random.SeedSequence(self.seed).spawn(self.n_trees)
+		n_jobs = os.cpu_count() if self.n_jobs is None else self.n_jobs
+		if n_jobs == 1:
+			_train.update(arrays); _train['options'] = options
+			try:
+				grown = [_grow_tree(s) for s in seeds]
+			finally:
+				_train.clear()
+		else:
+			blocks = list()
+			try:
+				specs = dict()
+				for name, array in arrays.items():
+					block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+					blocks.append(block)
+					np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+					specs[name] = (block.name, array.shape, array.dtype)
+				with ProcessPoolExecutor(min(n_jobs, self.n_trees), initializer=_attach, initargs=(specs, {'options': options})) as pool:
+					grown = list(pool.map(_grow_tree, seeds))
+			finally:
+				for block in blocks:
+					block.close(); block.unlink()
+		self.trees = [tree for tree, oob, predicted in grown]
+		if self.classes is None:
+			counts, sums = np.zeros(len(y)), np.zeros(len(y))
+			for tree, oob, predicted in grown:
+				counts[oob] += 1
+				sums[oob] += predicted
+			voted = counts > 0
+			self.oob_prediction = np.full(len(y), np.nan)
+			self.oob_prediction[voted] = sums[voted]/counts[voted]
+			self.oob_score = r2_score(y[voted], self.oob_prediction[voted])
+			return self
+		n_classes = len(self.classes)
+		self.oob_votes = np.zeros((len(y), n_classes), dtype=np.intp)
+		for tree, oob, predicted in grown:
+			self.oob_votes += np.bincount(oob*n_classes + predicted, minlength=len(y)*n_classes).reshape(len(y), n_classes)
+		voted = np.sum(self.oob_votes, axis=1) > 0
+		self.oob_score = np.mean(np.argmax(self.oob_votes[voted], axis=1) == y[voted])
+		return self
+
+	# Class codes (values for regression) predicted by every tree for every row of X, one column per tree
+	def tree_predictions(self, X):
+		X = np.asarray(X, dtype=float)
+		return np.column_stack([tree.predict(X) for tree in self.trees])
+
+	# Fraction of the trees voting for each class, for every row of X
+	def predict_proba(self, X):
+		codes = self.tree_predictions(X)
+		n_classes = len(self.classes)
+		rows = np.repeat(np.arange(len(codes)), codes.shape[1])
+		votes = np.bincount(rows*n_classes + codes.ravel(), minlength=len(codes)*n_classes)
+		return votes.reshape(len(codes), n_classes) / float(len(self.trees))
+
+	# Majority vote of the trees for every row of X, or their mean prediction for regression
+	def predict(self, X):
+		if self.classes is None:
+			return np.mean(self.tree_predictions(X), axis=1)
+		return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+	# Accuracy on the rows of X with the given labels, or R2 score for regression
+	def score(self, X, labels):
+		if self.classes is None:
+			return r2_score(np.ravel(labels), self.predict(X))
+		return np.mean(self.predict(X) == np.asarray(labels))
+
+# Random Forest Algorithm, with the interface of decision_tree in cart.py for evaluate_algorithm.
+# The forest grows its trees in one process; evaluate_algorithm can run the folds in parallel instead
+def random_forest(X_train, y_train, X_test, max_depth, min_size, n_trees = 100, max_features = 'sqrt', mode = 'exact'):
+	forest = RandomForest(n_trees, max_depth, min_size, max_features, mode, n_jobs=1).fit(X_train, y_train)
+	return forest.predict(X_test)
@@ -3,8 +3,8 @@ import numpy as np
 from sklearn.model_selection import  train_test_split 
 from sklearn.datasets import load_breast_cancer
 import scikitplot as skplt
-from sklearn.ensemble import GradientBoostingClassifier
-from sklearn.model_selection import cross_validate
+from cart import bin_features
+from boosting import GradientBoosting
 
 # Load the data
 cancer = load_breast_cancer()
@@ -19,10 +19,17 @@ scaler.fit(X_train)
 X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
-gd_clf = GradientBoostingClassifier(max_depth=3, n_estimators=100, learning_rate=1.0)  
+gd_clf = GradientBoosting(loss='logistic', max_depth=3, n_trees=100, learning_rate=1.0, reg_lambda=0.0, min_child_weight=0.0)
 gd_clf.fit(X_train_scaled, y_train)
-#Cross validation
-accuracy = cross_validate(gd_clf,X_test_scaled,y_test,cv=10)['test_score']
+#Cross validation, binning the data once for all folds
+B, edges = bin_features(X_test_scaled)
+folds = np.array_split(np.random.permutation(len(y_test)), 10)
+accuracy = np.zeros(len(folds))
+for i, fold in enumerate(folds):
+    train = np.setdiff1d(np.arange(len(y_test)), fold)
+    model = GradientBoosting(loss='logistic', max_depth=3, n_trees=100, learning_rate=1.0, reg_lambda=0.0, min_child_weight=0.0)
+    model.fit(None, y_test[train], bins=(B[train], edges))
+    accuracy[i] = model.score(X_test_scaled[fold], y_test[fold])
 print(accuracy)
 print("Test set accuracy with Random Forests and scaled data: {:.2f}".format(gd_clf.score(X_test_scaled,y_test)))
 
@@ -1,10 +1,11 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 import scikitplot as skplt
 from sklearn.metrics import mean_squared_error
+from cart import bin_features
+from boosting import GradientBoosting
 
 n = 1000
 maxdegree = 6
@@ -22,10 +23,12 @@ scaler = StandardScaler()
 scaler.fit(X_train)
 X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
+# bin the training data once for all depths
+bins = bin_features(X_train_scaled)
 
 for degree in range(1,maxdegree):
-    model = GradientBoostingRegressor(max_depth=degree, n_estimators=100, learning_rate=1.0)  
-    model.fit(X_train_scaled,y_train)
+    model = GradientBoosting(max_depth=degree, n_trees=100, learning_rate=1.0, reg_lambda=0.0, min_child_weight=0.0)
+    model.fit(X_train_scaled, y_train, bins=bins)
     y_pred = model.predict(X_test_scaled)
     polydegree[degree] = degree
     error[degree] = np.mean( np.mean((y_test - y_pred)**2) )
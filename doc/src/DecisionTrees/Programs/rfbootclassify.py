@@ -3,52 +3,48 @@ import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import make_pipeline
-from sklearn.utils import resample
-from sklearn.tree import DecisionTreeRegressor
-
-n = 100
-n_boostraps = 100
-maxdepth = 8
-
-# Make data set.
-x = np.linspace(-3, 3, n).reshape(-1, 1)
-y = np.exp(-x**2) + 1.5 * np.exp(-(x-2)**2)+ np.random.normal(0, 0.1, x.shape)
-error = np.zeros(maxdepth)
-bias = np.zeros(maxdepth)
-variance = np.zeros(maxdepth)
-polydegree = np.zeros(maxdepth)
-X_train, X_test, y_train, y_test = train_test_split(x, y, test_size=0.2)
-
-from sklearn.preprocessing import StandardScaler
-scaler = StandardScaler()
-scaler.fit(X_train)
-X_train_scaled = scaler.transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-for degree in range(1,maxdepth):
-    model = DecisionTreeRegressor(max_depth=degree) 
-    y_pred = np.empty((y_test.shape[0], n_boostraps))
-    for i in range(n_boostraps):
-        x_, y_ = resample(X_train_scaled, y_train)
-        model.fit(x_, y_)
-        y_pred[:, i] = model.predict(X_test_scaled)#.ravel()
-
-    polydegree[degree] = degree
-    error[degree] = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
-    bias[degree] = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
-    variance[degree] = np.mean( np.var(y_pred, axis=1, keepdims=True) )
-    print('Polynomial degree:', degree)
-    print('Error:', error[degree])
-    print('Bias^2:', bias[degree])
-    print('Var:', variance[degree])
-    print('{} >= {} + {} = {}'.format(error[degree], bias[degree], variance[degree], bias[degree]+variance[degree]))
-
-plt.xlim(1,maxdepth)
-plt.plot(polydegree, error, label='Error')
-plt.plot(polydegree, bias, label='bias')
-plt.plot(polydegree, variance, label='Variance')
-plt.legend()
-plt.show()
-
-
-
+from forest import RandomForest
+
+if __name__ == '__main__':
+    n = 100
+    n_boostraps = 100
+    maxdepth = 8
+
+    # Make data set.
+    x = np.linspace(-3, 3, n).reshape(-1, 1)
+    y = np.exp(-x**2) + 1.5 * np.exp(-(x-2)**2)+ np.random.normal(0, 0.1, x.shape)
+    error = np.zeros(maxdepth)
+    bias = np.zeros(maxdepth)
+    variance = np.zeros(maxdepth)
+    polydegree = np.zeros(maxdepth)
+    X_train, X_test, y_train, y_test = train_test_split(x, y, test_size=0.2)
+
+    from sklearn.preprocessing import StandardScaler
+    scaler = StandardScaler()
+    scaler.fit(X_train)
+    X_train_scaled = scaler.transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    for degree in range(1,maxdepth):
+        # every tree of a bagged forest (all features at every node) is a regression tree fitted to
+        # one bootstrap sample, so one fit replaces the loop over the bootstrap samples
+        model = RandomForest(n_trees=n_boostraps, max_depth=degree, max_features=None, criterion='mse')
+        model.fit(X_train_scaled, y_train)
+        y_pred = model.tree_predictions(X_test_scaled)
+
+        polydegree[degree] = degree
+        error[degree] = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
+        bias[degree] = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
+        variance[degree] = np.mean( np.var(y_pred, axis=1, keepdims=True) )
+        print('Polynomial degree:', degree)
+        print('Error:', error[degree])
+        print('Bias^2:', bias[degree])
+        print('Var:', variance[degree])
+        print('{} >= {} + {} = {}'.format(error[degree], bias[degree], variance[degree], bias[degree]+variance[degree]))
+
+    plt.xlim(1,maxdepth)
+    plt.plot(polydegree, error, label='Error')
+    plt.plot(polydegree, bias, label='bias')
+    plt.plot(polydegree, variance, label='Variance')
+    plt.legend()
+    plt.show()
@@ -3,53 +3,52 @@ import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import make_pipeline
-from sklearn.utils import resample
-from sklearn.ensemble import RandomForestRegressor
-
-np.random.seed(2018)
-
-n = 500
-n_boostraps = 100
-maxdegree = 14
-
-# Make data set.
-x = np.linspace(-3, 3, n).reshape(-1, 1)
-y = np.exp(-x**2) + 1.5 * np.exp(-(x-2)**2)+ np.random.normal(0, 0.1, x.shape)
-
-error = np.zeros(maxdegree)
-bias = np.zeros(maxdegree)
-variance = np.zeros(maxdegree)
-polydegree = np.zeros(maxdegree)
-X_train, X_test, y_train, y_test = train_test_split(x, y, test_size=0.2)
-
-from sklearn.preprocessing import StandardScaler
-scaler = StandardScaler()
-scaler.fit(X_train)
-X_train_scaled = scaler.transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-for degree in range(maxdegree):
-    model = RandomForestRegressor()
-    y_pred = np.empty((y_test.shape[0], n_boostraps))
-    for i in range(n_boostraps):
-        x_, y_ = resample(X_train_scaled, y_train)
-        model.fit(x_, y_.ravel())
-        y_pred[:, i] = model.predict(X_test_scaled)
-
-    polydegree[degree] = degree
-    error[degree] = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
-    bias[degree] = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
-    variance[degree] = np.mean( np.var(y_pred, axis=1, keepdims=True) )
-    print('Polynomial degree:', degree)
-    print('Error:', error[degree])
-    print('Bias^2:', bias[degree])
-    print('Var:', variance[degree])
-    print('{} >= {} + {} = {}'.format(error[degree], bias[degree], variance[degree], bias[degree]+variance[degree]))
-
-plt.plot(polydegree, error, label='Error')
-plt.plot(polydegree, bias, label='bias')
-plt.plot(polydegree, variance, label='Variance')
-plt.legend()
-plt.show()
-
-
+from forest import RandomForest
+
+if __name__ == '__main__':
+    np.random.seed(2018)
+
+    n = 500
+    n_boostraps = 100
+    maxdegree = 14
+
+    # Make data set.
+    x = np.linspace(-3, 3, n).reshape(-1, 1)
+    y = np.exp(-x**2) + 1.5 * np.exp(-(x-2)**2)+ np.random.normal(0, 0.1, x.shape)
+
+    error = np.zeros(maxdegree)
+    bias = np.zeros(maxdegree)
+    variance = np.zeros(maxdegree)
+    polydegree = np.zeros(maxdegree)
+    X_train, X_test, y_train, y_test = train_test_split(x, y, test_size=0.2)
+
+    from sklearn.preprocessing import StandardScaler
+    scaler = StandardScaler()
+    scaler.fit(X_train)
+    X_train_scaled = scaler.transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    for degree in range(1,maxdegree):
+        # the trees of the forest are fitted to n_boostraps bootstrap samples of the training data,
+        # so their predictions replace a loop refitting a model to every bootstrap sample
+        model = RandomForest(n_trees=n_boostraps, max_depth=degree, max_features=None, criterion='mse', seed=2018)
+        model.fit(X_train_scaled, y_train)
+        y_pred = model.tree_predictions(X_test_scaled)
+
+        polydegree[degree] = degree
+        error[degree] = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
+        bias[degree] = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
+        variance[degree] = np.mean( np.var(y_pred, axis=1, keepdims=True) )
+        print('Polynomial degree:', degree)
+        print('Error:', error[degree])
+        print('Bias^2:', bias[degree])
+        print('Var:', variance[degree])
+        print('{} >= {} + {} = {}'.format(error[degree], bias[degree], variance[degree], bias[degree]+variance[degree]))
+        print('Out-of-bag R2 of the forest:', model.oob_score)
+
+    plt.xlim(1,maxdegree-1)
+    plt.plot(polydegree, error, label='Error')
+    plt.plot(polydegree, bias, label='bias')
+    plt.plot(polydegree, variance, label='Variance')
+    plt.legend()
+    plt.show()
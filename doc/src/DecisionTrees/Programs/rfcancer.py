@@ -2,38 +2,35 @@ import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import  train_test_split 
 from sklearn.datasets import load_breast_cancer
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import cross_validate
 import scikitplot as skplt
+from forest import RandomForest
 
-# Load the data
-cancer = load_breast_cancer()
+if __name__ == '__main__':
+    # Load the data
+    cancer = load_breast_cancer()
 
-X_train, X_test, y_train, y_test = train_test_split(cancer.data,cancer.target,random_state=0)
-print(X_train.shape)
-print(X_test.shape)
-#now scale the data
-from sklearn.preprocessing import StandardScaler
-scaler = StandardScaler()
-scaler.fit(X_train)
-X_train_scaled = scaler.transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-# Data set not specificied
-#Instantiate the model with 100 trees and entropy as splitting criteria
-Random_Forest_model = RandomForestClassifier(n_estimators=500,criterion="entropy")
-Random_Forest_model.fit(X_train_scaled, y_train)
-#Cross validation
-accuracy = cross_validate(Random_Forest_model,X_test_scaled,y_test,cv=10)['test_score']
-print(accuracy)
-print("Test set accuracy with Random Forests and scaled data: {:.2f}".format(Random_Forest_model.score(X_test_scaled,y_test)))
+    X_train, X_test, y_train, y_test = train_test_split(cancer.data,cancer.target,random_state=0)
+    print(X_train.shape)
+    print(X_test.shape)
+    #now scale the data
+    from sklearn.preprocessing import StandardScaler
+    scaler = StandardScaler()
+    scaler.fit(X_train)
+    X_train_scaled = scaler.transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    # Data set not specificied
+    #Instantiate the model with 500 trees, each node splitting on the best of sqrt(30) random features
+    Random_Forest_model = RandomForest(n_trees=500, max_features='sqrt', seed=0)
+    Random_Forest_model.fit(X_train_scaled, y_train)
+    #Out-of-bag accuracy: every training row is predicted by the trees grown without it, no refits needed
+    print("Out-of-bag accuracy with Random Forests and scaled data: {:.2f}".format(Random_Forest_model.oob_score))
+    print("Test set accuracy with Random Forests and scaled data: {:.2f}".format(Random_Forest_model.score(X_test_scaled,y_test)))
 
-y_pred = Random_Forest_model.predict(X_test_scaled)
-skplt.metrics.plot_confusion_matrix(y_test, y_pred, normalize=True)
-plt.show()
-y_probas = Random_Forest_model.predict_proba(X_test_scaled)
-skplt.metrics.plot_roc(y_test, y_probas)
-plt.show()
-skplt.metrics.plot_cumulative_gain(y_test, y_probas)
-plt.show()
+    y_pred = Random_Forest_model.predict(X_test_scaled)
+    skplt.metrics.plot_confusion_matrix(y_test, y_pred, normalize=True)
+    plt.show()
+    y_probas = Random_Forest_model.predict_proba(X_test_scaled)
+    skplt.metrics.plot_roc(y_test, y_probas)
+    plt.show()
+    skplt.metrics.plot_cumulative_gain(y_test, y_probas)
+    plt.show()
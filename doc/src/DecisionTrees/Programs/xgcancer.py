@@ -2,10 +2,8 @@ import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import  train_test_split 
 from sklearn.datasets import load_breast_cancer
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import cross_validate
 import scikitplot as skplt
-import xgboost as xgb
+from boosting import GradientBoosting
 # Load the data
 cancer = load_breast_cancer()
 
@@ -19,7 +17,7 @@ scaler.fit(X_train)
 X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
-xg_clf = xgb.XGBClassifier(max_depth = 4, n_estimators = 200)
+xg_clf = GradientBoosting(loss = 'logistic', max_depth = 4, n_trees = 200, learning_rate = 0.3)
 xg_clf.fit(X_train_scaled,y_train)
 
 y_test = xg_clf.predict(X_test_scaled)
@@ -36,11 +34,10 @@ plt.show()
 skplt.metrics.plot_cumulative_gain(y_test, y_probas)
 plt.show()
 
-
-xgb.plot_tree(xg_clf,num_trees=0)
-plt.rcParams['figure.figsize'] = [50, 10]
-plt.show()
-
-xgb.plot_importance(xg_clf)
+# feature importance: total gain of the splits on every feature
+order = np.argsort(xg_clf.importance)
 plt.rcParams['figure.figsize'] = [5, 5]
+plt.barh(np.arange(len(order)), xg_clf.importance[order])
+plt.yticks(np.arange(len(order)), cancer.feature_names[order])
+plt.xlabel('Gain')
 plt.show()
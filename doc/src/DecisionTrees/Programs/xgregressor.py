@@ -1,10 +1,11 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
-import xgboost as xgb
 from sklearn.preprocessing import StandardScaler
 import scikitplot as skplt
 from sklearn.metrics import mean_squared_error
+from cart import bin_features
+from boosting import GradientBoosting
 
 
 def plot_decision_boundary(clf, X, y, axes=[-1.5, 2.5, -1, 1.5], alpha=0.5, contour=True):
@@ -40,11 +41,13 @@ scaler = StandardScaler()
 scaler.fit(X_train)
 X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
+# bin the training data once for all depths
+bins = bin_features(X_train_scaled)
 
-for degree in range(maxdegree):
-    model =  xgb.XGBRegressor(objective ='reg:squarederror', colsample_bytree = 0.3, learning_rate = 0.1,
-                max_depth = degree, alpha = 10, n_estimators = 10)
-    model.fit(X_train_scaled,y_train)
+for degree in range(1,maxdegree):
+    model = GradientBoosting(loss = 'squared_error', colsample = 0.3, learning_rate = 0.1,
+                max_depth = degree, reg_alpha = 10, n_trees = 10)
+    model.fit(X_train_scaled, y_train, bins=bins)
     y_pred = model.predict(X_test_scaled)
     polydegree[degree] = degree
     error[degree] = np.mean( np.mean((y_test - y_pred)**2) )